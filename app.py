@@ -1,43 +1,49 @@
 from flask import Flask, redirect, url_for
-from models import db
-from controllers import admin_controller, user_controller, quiz_controller
 from flask_login import LoginManager
-
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///quiz_master.db'
-app.config['SECRET_KEY'] = 'your_secret_key'
+from config import Config
 
 # Initialize LoginManager
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'user.login'
 
-# Define the user_loader callback
+# The one user_loader callback; served from the identity cache in services/identity.py
 @login_manager.user_loader
 def load_user(user_id):
-    from models.user import User  # Import User model here to avoid circular import
-    return User.query.get(int(user_id))  # Return the user object based on ID
-
-# Initialize extensions
-db.init_app(app)
-
-# Import models after db initialization
-with app.app_context():
-    from models.user import User
-    from models.subject import Subject
-    from models.chapter import Chapter
-    from models.quiz import Quiz, Question
-    # Drop all tables and recreate them
-    db.create_all()
-
-# Register blueprints
-app.register_blueprint(admin_controller.bp, url_prefix='/admin')
-app.register_blueprint(user_controller.bp, url_prefix='/user')
-app.register_blueprint(quiz_controller.bp, url_prefix='/quiz')
-
-@app.route('/')
+    from services import identity  # Imported here to avoid a circular import
+    return identity.load_user(user_id)
+
 def index():
     return redirect(url_for('user.dashboard'))
 
+# Blueprints are imported here rather than at module level, so importing this module stays cheap
+def register_blueprints(app):
+    from controllers import admin_controller, user_controller, quiz_controller
+    app.register_blueprint(admin_controller.bp, url_prefix='/admin')
+    app.register_blueprint(user_controller.bp, url_prefix='/user')
+    app.register_blueprint(quiz_controller.bp, url_prefix='/quiz')
+
+# Application factory. The schema is not touched here; use `flask --app app init-db` / `upgrade-db`.
+def create_app(config=Config):
+    from models.engine import init_engine
+    from commands import register_commands
+    from services.metrics import init_metrics
+
+    app = Flask(__name__)
+    app.config.from_object(config)
+    # Behind a reverse proxy request.remote_addr is the proxy; take the client from X-Forwarded-For
+    if app.config.get('TRUSTED_PROXIES'):
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'])
+
+    # Initialize extensions with the engine profile from the config
+    init_engine(app)
+    init_metrics(app)
+    login_manager.init_app(app)
+
+    register_blueprints(app)
+    register_commands(app)
+    app.add_url_rule('/', 'index', index)
+    return app
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
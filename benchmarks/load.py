@@ -0,0 +1,358 @@
+"""Load test the exam-day workload and compare it with a saved baseline.
+
+Seeds a benchmark database with services.seed (the generator behind `flask seed`), then
+runs virtual users that log in and loop over a weighted mix of scenarios for a fixed time,
+either in-process through the Flask test client or against a running server (--url).
+Reports p50/p99 latency, throughput and SQL queries per request; queries come from the
+/metrics endpoint, so against a multi-worker server they only cover the worker that answers
+the scrapes.
+
+    python benchmarks/load.py --concurrency 8 --duration 30 --save-baseline benchmarks/baseline.json
+    python benchmarks/load.py --concurrency 8 --duration 30 --baseline benchmarks/baseline.json
+
+With --baseline the run exits with status 1 if any scenario regressed beyond --tolerance.
+Against a server, start it on the seeded database first, e.g.
+DATABASE_URL=sqlite:////abs/path/instance/benchmark/quiz_master.db gunicorn "app:create_app()".
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = 'password'
+
+# Scenario -> endpoint whose query counts are reported with it
+ENDPOINTS = {
+    'login': 'user.login',
+    'dashboard': 'user.dashboard',
+    'start_quiz': 'user.start_quiz',
+    'submit_quiz': 'user.submit_quiz',
+    'user_summary': 'user.user_summary',
+    'admin_analytics': 'admin.analytics_data',
+    'admin_performance': 'admin.user_performance_data',
+    'admin_progress': 'admin.user_progress_data',
+}
+
+MIXES = {
+    # Students sitting a scheduled exam, with a few admins watching the charts
+    'exam-day': {'login': 5, 'dashboard': 25, 'start_quiz': 25, 'submit_quiz': 25, 'user_summary': 10,
+                 'admin_analytics': 4, 'admin_performance': 3, 'admin_progress': 3},
+    # Students reviewing results between exams
+    'browse': {'login': 5, 'dashboard': 50, 'user_summary': 35, 'start_quiz': 5, 'submit_quiz': 5},
+    'admin': {'admin_analytics': 40, 'admin_performance': 30, 'admin_progress': 30},
+}
+
+TOKEN_RE = re.compile(r'name="session_token" value="([^"]+)"')
+QUESTION_RE = re.compile(r'name="question_(\d+)"')
+METRIC_RE = re.compile(r'^quiz_db_queries_per_request_(sum|count)\{endpoint="([^"]+)"\} (\S+)$', re.M)
+
+
+def make_config(db_path):
+    from config import Config
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+    return BenchmarkConfig
+
+
+def make_app(db_path):
+    from app import create_app
+    app = create_app(make_config(db_path))
+    # Keep the submission journal and profiles next to the benchmark database
+    app.instance_path = os.path.dirname(db_path)
+    return app
+
+
+class TestClientSession:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.get_data(as_text=True)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+        )
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(urllib.request.Request(self.base_url + path, data=body, method=method)) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode(errors='replace')
+
+
+# One simulated student: logs in once, then runs scenarios until the deadline
+class VirtualUser:
+    def __init__(self, session, username, quiz_ids, rng):
+        self.session = session
+        self.username = username
+        self.quiz_ids = quiz_ids
+        self.rng = rng
+        self.pending = []  # (quiz_id, session token, question ids) of started attempts
+        self.admin = False
+
+    def login(self):
+        return self.session.request('POST', '/user/login', {'username': self.username, 'password': PASSWORD}), (302,)
+
+    def dashboard(self):
+        return self.session.request('GET', '/user/'), (200,)
+
+    def start_quiz(self):
+        quiz_id = self.rng.choice(self.quiz_ids)
+        status, body = self.session.request('GET', f'/user/start_quiz/{quiz_id}')
+        token = TOKEN_RE.search(body)
+        if status == 200 and token:
+            self.pending.append((quiz_id, token.group(1), QUESTION_RE.findall(body)))
+        return (status, body), (200,)
+
+    def submit_quiz(self):
+        if not self.pending:
+            return None  # Nothing started yet; the caller runs start_quiz instead
+        quiz_id, token, question_ids = self.pending.pop()
+        form = {f'question_{question_id}': str(self.rng.randint(1, 4)) for question_id in set(question_ids)}
+        form['session_token'] = token
+        return self.session.request('POST', f'/user/submit_quiz/{quiz_id}', form), (302,)
+
+    def user_summary(self):
+        return self.session.request('GET', '/user/user_summary'), (200,)
+
+    def _admin_get(self, path):
+        if not self.admin:
+            self.session.request('POST', '/admin/login', {'username': 'admin', 'password': 'admin123'})
+            self.admin = True
+        return self.session.request('GET', path), (200,)
+
+    def admin_analytics(self):
+        return self._admin_get('/admin/analytics_data')
+
+    def admin_performance(self):
+        return self._admin_get('/admin/user_performance_data')
+
+    def admin_progress(self):
+        return self._admin_get('/admin/user_progress_data')
+
+    # Run one scenario; returns (scenario, seconds, ok)
+    def run(self, scenario):
+        start = time.perf_counter()
+        outcome = getattr(self, scenario)()
+        if outcome is None:
+            scenario = 'start_quiz'
+            start = time.perf_counter()
+            outcome = self.start_quiz()
+        (status, _), expected = outcome
+        return scenario, time.perf_counter() - start, status in expected
+
+
+def parse_mix(value):
+    if value in MIXES:
+        return MIXES[value]
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f'unknown scenario {name!r}; choose from {", ".join(ENDPOINTS)}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def scrape_queries(session):
+    status, body = session.request('GET', '/metrics')
+    totals = defaultdict(lambda: [0.0, 0.0])
+    if status == 200:
+        for kind, endpoint, value in METRIC_RE.findall(body):
+            totals[endpoint][0 if kind == 'sum' else 1] = float(value)
+    return totals
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_load(new_session, usernames, quiz_ids, mix, concurrency, duration, warmup, rng):
+    names, weights = list(mix), list(mix.values())
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(concurrency + 1)
+    measure_from = [None]
+    stop_at = [None]
+
+    def worker(index):
+        user_rng = random.Random(rng.random())
+        user = VirtualUser(new_session(), usernames[index % len(usernames)], quiz_ids, user_rng)
+        user.run('login')
+        start_barrier.wait()
+        while time.perf_counter() < stop_at[0]:
+            scenario, seconds, ok = user.run(user_rng.choices(names, weights)[0])
+            if time.perf_counter() < measure_from[0]:
+                continue  # Warming up
+            with lock:
+                samples[scenario].append(seconds)
+                if not ok:
+                    errors[scenario] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    stop_at[0] = float('inf')
+    measure_from[0] = float('inf')
+    start_barrier.wait()
+    measure_from[0] = time.perf_counter() + warmup
+    stop_at[0] = measure_from[0] + duration
+    while time.perf_counter() < measure_from[0]:
+        time.sleep(0.01)
+    before = scrape_queries(new_session())
+    for thread in threads:
+        thread.join()
+    after = scrape_queries(new_session())
+    elapsed = time.perf_counter() - measure_from[0]
+
+    results = {}
+    for scenario, times in sorted(samples.items()):
+        times.sort()
+        query_sum, query_count = (after[ENDPOINTS[scenario]][i] - before[ENDPOINTS[scenario]][i] for i in (0, 1))
+        results[scenario] = {
+            'count': len(times),
+            'errors': errors[scenario],
+            'p50_ms': round(percentile(times, 0.5) * 1000, 2),
+            'p99_ms': round(percentile(times, 0.99) * 1000, 2),
+            'queries': round(query_sum / query_count, 2) if query_count else None,
+        }
+    total = sum(len(times) for times in samples.values())
+    return {'throughput': round(total / elapsed, 1), 'requests': total, 'scenarios': results}
+
+
+def print_report(report):
+    print(f'{"scenario":<18}{"count":>8}{"errors":>8}{"p50 ms":>10}{"p99 ms":>10}{"queries":>9}')
+    for scenario, row in report['scenarios'].items():
+        queries = '-' if row['queries'] is None else f'{row["queries"]:.1f}'
+        print(f'{scenario:<18}{row["count"]:>8}{row["errors"]:>8}{row["p50_ms"]:>10.1f}{row["p99_ms"]:>10.1f}{queries:>9}')
+    print(f'throughput: {report["throughput"]} req/s over {report["requests"]} requests')
+
+
+# Regressions against a baseline report: slower percentiles or lower throughput beyond the
+# tolerance, more queries per request, or any errors
+def compare(report, baseline, tolerance):
+    problems = []
+    if report['throughput'] < baseline['throughput'] * (1 - tolerance):
+        problems.append(f'throughput {report["throughput"]} req/s < baseline {baseline["throughput"]} req/s')
+    for scenario, row in report['scenarios'].items():
+        if row['errors']:
+            problems.append(f'{scenario}: {row["errors"]} failed requests')
+        base = baseline['scenarios'].get(scenario)
+        if base is None:
+            continue
+        for key in ('p50_ms', 'p99_ms'):
+            if row[key] > base[key] * (1 + tolerance):
+                problems.append(f'{scenario}: {key} {row[key]} > baseline {base[key]}')
+        if row['queries'] is not None and base.get('queries') is not None and row['queries'] > base['queries'] + 0.5:
+            problems.append(f'{scenario}: {row["queries"]} queries per request > baseline {base["queries"]}')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=os.path.join(ROOT, 'instance', 'benchmark', 'quiz_master.db'))
+    parser.add_argument('--reseed', action='store_true', help='Recreate the benchmark database')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for data and workload')
+    parser.add_argument('--subjects', type=int, default=5)
+    parser.add_argument('--chapters', type=int, default=4, help='Chapters per subject')
+    parser.add_argument('--quizzes', type=int, default=5, help='Quizzes per chapter')
+    parser.add_argument('--questions', type=int, default=20, help='Questions per quiz')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--attempts', type=int, default=10, help='Attempts per user')
+    parser.add_argument('--url', help='Drive a running server instead of the test client')
+    parser.add_argument('--mix', type=parse_mix, default='exam-day',
+                        help=f'{", ".join(MIXES)} or weights like dashboard=3,submit_quiz=1')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--baseline', help='Fail if this run regressed against the saved report')
+    parser.add_argument('--save-baseline', help='Write this run\'s report for later comparison')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed latency/throughput change')
+    args = parser.parse_args()
+
+    db_path = os.path.abspath(args.db)
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    if args.reseed:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    app = make_app(db_path)
+    if not os.path.exists(db_path):
+        started = time.perf_counter()
+        with app.app_context():
+            from models.schema import upgrade_schema
+            from services import seed
+            upgrade_schema()
+            seed.generate(args.seed, subjects=args.subjects, chapters=args.chapters, quizzes=args.quizzes,
+                          questions=args.questions, users=args.users, attempts=args.attempts, password=PASSWORD)
+        print(f'Seeded {db_path} in {time.perf_counter() - started:.1f} s')
+
+    with app.app_context():
+        from models import db
+        from models.quiz import Quiz
+        from models.user import User
+        quiz_ids = [quiz_id for (quiz_id,) in db.session.query(Quiz.id)]
+        usernames = [name for (name,) in db.session.query(User.username).filter(User.username.like('seed%'))]
+    if not quiz_ids or not usernames:
+        parser.error(f'{db_path} has no benchmark quizzes or users; rerun with --reseed')
+
+    if args.url:
+        def new_session():
+            return HttpSession(args.url)
+    else:
+        def new_session():
+            return TestClientSession(app)
+
+    rng = random.Random(args.seed)
+    report = run_load(new_session, usernames, quiz_ids, args.mix, args.concurrency, args.duration, args.warmup, rng)
+    report['settings'] = {
+        'target': args.url or 'test-client', 'mix': args.mix, 'concurrency': args.concurrency,
+        'duration': args.duration, 'seed': args.seed,
+    }
+    print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as stream:
+            json.dump(report, stream, indent=2)
+        print(f'Baseline written to {args.save_baseline}')
+    if args.baseline:
+        with open(args.baseline) as stream:
+            problems = compare(report, json.load(stream), args.tolerance)
+        if problems:
+            print('Regressions against the baseline:')
+            for problem in problems:
+                print(f'  {problem}')
+            sys.exit(1)
+        print('No regressions against the baseline.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Measure worker startup: time to import the app module and build an app with create_app().
+
+Each sample runs in a fresh interpreter, like a newly forked gunicorn worker.
+
+    python benchmarks/startup.py --runs 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPET = '''
+import time
+start = time.perf_counter()
+from app import create_app
+app = create_app()
+print(time.perf_counter() - start)
+'''
+
+
+def sample():
+    output = subprocess.run(
+        [sys.executable, '-c', SNIPPET], cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    times = sorted(sample() for _ in range(args.runs))
+    print(f'runs:   {args.runs}')
+    print(f'median: {statistics.median(times) * 1000:.1f} ms')
+    print(f'min:    {times[0] * 1000:.1f} ms')
+    print(f'max:    {times[-1] * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import click
+
+# Flask CLI commands, registered by create_app.
+# Service imports stay inside the commands so they cost nothing at worker startup.
+
+
+def register_commands(app):
+    # Create all tables on a fresh database
+    @app.cli.command('init-db')
+    def init_db():
+        from models.schema import upgrade_schema
+        upgrade_schema()
+        click.echo('Database initialized.')
+
+    # Apply index and constraint upgrades to an existing database
+    @app.cli.command('upgrade-db')
+    def upgrade_db():
+        from models import db
+        from models.schema import upgrade_schema
+        from models.analytics import UserStats, ItemStats, LeaderboardEntry
+        from models.quiz import UserQuizProgress
+        from services import analytics
+        upgrade_schema()
+        # Fill the rollup tables the first time they are created on a database with attempts
+        empty = any(model.query.first() is None for model in (UserStats, ItemStats, LeaderboardEntry))
+        if empty and UserQuizProgress.query.first() is not None:
+            analytics.rebuild()
+            db.session.commit()
+        click.echo('Database schema is up to date.')
+
+    # Recompute the analytics rollup tables from UserQuizProgress
+    @app.cli.command('rebuild-analytics')
+    def rebuild_analytics():
+        from models import db
+        from services import analytics
+        analytics.rebuild()
+        db.session.commit()
+        click.echo('Analytics rollups rebuilt.')
+
+    # Generate a synthetic catalog and attempt history for scaling experiments
+    @app.cli.command('seed')
+    @click.option('--seed', 'seed_value', default=1, show_default=True, help='Same seed, same data.')
+    @click.option('--subjects', default=10, show_default=True)
+    @click.option('--chapters', default=10, show_default=True, help='Chapters per subject.')
+    @click.option('--quizzes', default=10, show_default=True, help='Quizzes per chapter.')
+    @click.option('--questions', default=20, show_default=True, help='Questions per quiz.')
+    @click.option('--users', default=10000, show_default=True)
+    @click.option('--attempts', default=10, show_default=True, help='Attempts per user, on distinct quizzes.')
+    @click.option('--password', default='password', show_default=True, help='Password of every generated user.')
+    @click.option('--batch-size', default=10000, show_default=True)
+    def seed(seed_value, subjects, chapters, quizzes, questions, users, attempts, password, batch_size):
+        import time
+        from models.schema import upgrade_schema
+        from services import seed as seeding
+        upgrade_schema()
+        started = time.perf_counter()
+        try:
+            counts = seeding.generate(
+                seed_value, subjects=subjects, chapters=chapters, quizzes=quizzes, questions=questions,
+                users=users, attempts=attempts, password=password, batch_size=batch_size,
+                progress=lambda message: click.echo(f'[{time.perf_counter() - started:7.1f}s] {message}')
+            )
+        except seeding.SeedError as e:
+            raise click.ClickException(str(e))
+        click.echo('Seeded ' + ', '.join(f'{count} {name}' for name, count in counts.items()) + '.')
+
+    # Bulk import a CSV or JSON question bank into a quiz
+    @app.cli.command('import-questions')
+    @click.argument('quiz_id', type=int)
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--chunk-size', default=500, show_default=True)
+    def import_questions(quiz_id, path, chunk_size):
+        from models import db
+        from models.quiz import Quiz
+        from services import question_bank
+        if db.session.get(Quiz, quiz_id) is None:
+            raise click.ClickException(f'Quiz {quiz_id} does not exist.')
+        with open(path, encoding='utf-8-sig', newline='') as stream:
+            try:
+                count = question_bank.import_questions(
+                    quiz_id, question_bank.iter_rows(stream, path), chunk_size=chunk_size
+                )
+            except question_bank.QuestionImportError as e:
+                raise click.ClickException('\n'.join(e.errors))
+        click.echo(f'Imported {count} questions into quiz {quiz_id}.')
+
+    # Stream the questions of a quiz to stdout or a file
+    @app.cli.command('export-questions')
+    @click.argument('quiz_id', type=int)
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), default='csv', show_default=True)
+    @click.option('--output', type=click.File('w'), default='-')
+    def export_questions(quiz_id, fmt, output):
+        from services import question_bank
+        export = question_bank.export_json if fmt == 'json' else question_bank.export_csv
+        for chunk in export(quiz_id):
+            output.write(chunk)
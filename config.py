@@ -2,5 +2,64 @@ import os
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your_secret_key'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///quiz_master.db'
+    # SQLite by default; set DATABASE_URL to a postgresql:// URL (with psycopg2 installed) for multi-node deployments
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///quiz_master.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    CATALOG_CACHE_SIZE = 512  # Max entries in the in-process catalog cache
+
+    # Connection pool
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = 30
+    DB_POOL_RECYCLE = 1800  # Server backends only
+
+    # Applied to every new SQLite connection
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',  # Readers no longer block behind the writer
+        'synchronous': 'NORMAL',  # Safe with WAL, skips an fsync per commit
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64000,  # Page cache in KiB (negative value)
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'ON',  # Enforce the ON DELETE CASCADE declared on the models
+    }
+
+    # Write-behind submission queue
+    SUBMISSION_ACK = 'commit'  # 'commit' waits for the batch commit, 'journal' returns once journaled
+    SUBMISSION_ACK_TIMEOUT = 10
+    SUBMISSION_BATCH_SIZE = 200
+    SUBMISSION_FLUSH_INTERVAL = 0.05
+    SUBMISSION_JOURNAL_FSYNC = True
+    SUBMISSION_POLL_MAX_WAIT = 25  # Longest a result long-poll may hold a worker thread
+
+    # Password hashing and login throttling
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))  # 0 hashes on the request thread
+    PASSWORD_HASH_QUEUE_LIMIT = 64
+    PASSWORD_HASH_TIMEOUT = 30
+    LOGIN_RATE_LIMIT_PER_USER = (10, 300)  # (attempts, seconds)
+    LOGIN_RATE_LIMIT_PER_IP = (50, 60)  # Failed logins only
+    REGISTER_RATE_LIMIT_PER_IP = (20, 3600)
+    # Reverse proxies in front of the app whose X-Forwarded-For is trusted for the client IP
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+
+    # Identity cache behind the Flask-Login user loader
+    USER_CACHE_SIZE = 4096
+    USER_CACHE_TTL = 300  # Seconds another worker may serve a stale name or role
+
+    # Timed quiz sessions
+    QUIZ_DEADLINE_GRACE = 30  # Seconds a submission may arrive after the deadline and still be graded from the form
+    QUIZ_HEARTBEAT_INTERVAL = 20
+    QUIZ_AUTOSAVE_FLUSH_INTERVAL = 15
+    RANDOMIZER_POOL_TTL = 300  # Seconds before difficulty strata are rebuilt from the item statistics
+
+    # Leaderboards held in memory per process
+    LEADERBOARD_CACHE_SIZE = 256  # Boards kept loaded
+    LEADERBOARD_TTL = 30  # Seconds before a board is reloaded to pick up other workers' submissions
+
+    # Instrumentation exposed on /metrics
+    METRICS_ALLOWED_HOSTS = ('127.0.0.1', '::1')  # Admin sessions may scrape from anywhere
+    QUERY_COUNT_WARNING = 50  # Log requests that run more SQL statements than this
+    PROFILE_SLOW_REQUESTS = os.environ.get('PROFILE_SLOW_REQUESTS') == '1'
+    PROFILE_SAMPLE_RATE = 0.05  # Share of requests run under cProfile when profiling is on
+    SLOW_REQUEST_SECONDS = 1.0  # Sampled requests slower than this are written to instance/profiles
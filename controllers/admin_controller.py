@@ -1,10 +1,12 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context
 from models import db
 from models.subject import Subject
-from models.user import User
-from models.quiz import Quiz, Question, UserQuizProgress
+from models.quiz import Quiz, Question
 from models.chapter import Chapter  # Import Chapter model
+from services import analytics, catalog, deletion, item_analysis, leaderboards, progress_report, question_bank, user_search
+from services.answer_key import VALID_OPTIONS
 from datetime import datetime
+import io
 
 bp = Blueprint('admin', __name__)
 
@@ -15,30 +17,41 @@ def dashboard():
         # Get the search query for users from the request
         search_query = request.args.get('search', '').strip()
 
-        # Fetch users based on the search query
-        if search_query:
-            users = User.query.filter(User.full_name.ilike(f'%{search_query}%')).all()
-        else:
-            users = User.query.all()  # Fetch all users if no search query is provided
+        # Fetch one page of users, filtered by the search query if one is given
+        users, next_after = user_search.search_users(search_query, after_id=request.args.get('after', type=int))
 
-        # Fetch all subjects and their associated chapters
-        subjects = Subject.query.all()
-        for subject in subjects:
-            subject.chapters = Chapter.query.filter_by(subject_id=subject.id).all()
+        # Fetch all subjects and their associated chapters from the catalog cache
+        subjects = catalog.get_tree()
 
-        # Fetch user performance data for the graph
-        user_performance_data = db.session.query(
-            User.full_name,
-            db.func.avg(UserQuizProgress.score).label('average_score')
-        ).join(UserQuizProgress, User.id == UserQuizProgress.user_id)\
-         .group_by(User.full_name).all()
+        # Fetch user performance data for the graph from the rollup table
+        user_performance_data = [(full_name, average) for _, full_name, average in analytics.user_averages()]
 
         # Render the template with the user, subject, and performance data
-        return render_template('admin/admin_dashboard.html', users=users, subjects=subjects, user_performance_data=user_performance_data)
+        return render_template('admin/admin_dashboard.html', users=users, next_after=next_after, subjects=subjects, user_performance_data=user_performance_data)
     else:
         flash('Please log in as Admin to access this page.', 'error')
         return redirect(url_for('admin.login'))
 
+# User Search as JSON for the dashboard search modal
+@bp.route('/users/search', methods=['GET'])
+def search_users():
+    if session.get('admin_logged_in'):
+        users, next_after = user_search.search_users(
+            request.args.get('q', ''), after_id=request.args.get('after', type=int)
+        )
+        return jsonify({
+            "users": [{
+                "id": user.id,
+                "full_name": user.full_name,
+                "username": user.username,
+                "qualification": user.qualification,
+                "dob": user.dob.isoformat(),
+            } for user in users],
+            "next_after": next_after
+        })
+    else:
+        return jsonify({"error": "Unauthorized access"}), 403
+
 # Admin Login
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -72,6 +85,7 @@ def create_subject():
 
             new_subject = Subject(name=subject_name, description=subject_description)
             db.session.add(new_subject)
+            catalog.bump_version()
             db.session.commit()
 
             flash('Subject created successfully!', 'success')
@@ -91,6 +105,7 @@ def edit_subject(subject_id):
             subject.name = request.form['name']
             subject.description = request.form['description']
 
+            catalog.bump_version()
             db.session.commit()
             flash('Subject updated successfully!', 'success')
             return redirect(url_for('admin.dashboard'))
@@ -104,23 +119,11 @@ def edit_subject(subject_id):
 @bp.route('/delete_subject/<int:subject_id>', methods=['POST'])
 def delete_subject(subject_id):
     if session.get('admin_logged_in'):
-        subject = Subject.query.get_or_404(subject_id)
+        Subject.query.get_or_404(subject_id)
 
-        # Delete all chapters related to the subject
-        chapters = Chapter.query.filter_by(subject_id=subject_id).all()
-        for chapter in chapters:
-            # Delete all quizzes related to each chapter
-            quizzes = Quiz.query.filter_by(chapter_id=chapter.id).all()
-            for quiz in quizzes:
-                # Delete all questions related to each quiz
-                questions = Question.query.filter_by(quiz_id=quiz.id).all()
-                for question in questions:
-                    db.session.delete(question)
-                db.session.delete(quiz)
-            db.session.delete(chapter)
-
-        # Delete the subject itself
-        db.session.delete(subject)
+        # Delete the subject with its chapters, quizzes, questions and attempts in set-based statements
+        deletion.delete_subject(subject_id)
+        catalog.bump_version()
         db.session.commit()
 
         flash('Subject and all associated chapters, quizzes, and questions deleted successfully!', 'success')
@@ -137,15 +140,19 @@ def create_quiz(chapter_id):
             title = request.form['title']
             date = request.form['date']
             duration = request.form['duration']
+            sample_size = request.form.get('sample_size')
 
             # Create a new Quiz instance
             quiz = Quiz(
                 title=title,
                 chapter_id=chapter_id,
                 date=datetime.strptime(date, '%Y-%m-%d').date(),
-                duration=int(duration)
+                duration=int(duration),
+                sample_size=int(sample_size) if sample_size else None,
+                shuffle='shuffle' in request.form
             )
             db.session.add(quiz)
+            catalog.bump_version()
             db.session.commit()
 
             flash('Quiz created successfully! Redirecting to add questions.', 'success')
@@ -168,6 +175,9 @@ def add_questions(quiz_id):
             option_2 = request.form['option_2']
             option_3 = request.form['option_3']
             option_4 = request.form['option_4']
+            if request.form['correct_option'] not in VALID_OPTIONS:
+                flash('The correct option must be 1, 2, 3 or 4.', 'error')
+                return redirect(url_for('admin.add_questions', quiz_id=quiz_id))
             correct_option = int(request.form['correct_option'])
 
             # Add the question to the database
@@ -181,6 +191,7 @@ def add_questions(quiz_id):
                 correct_option=correct_option
             )
             db.session.add(question)
+            catalog.bump_version()
             db.session.commit()
 
             flash('Question added successfully!', 'success')
@@ -193,12 +204,59 @@ def add_questions(quiz_id):
         flash('Please log in as Admin to access this page.', 'error')
         return redirect(url_for('admin.login'))
 
+# Bulk Import Questions from a CSV or JSON question bank
+@bp.route('/import_questions/<int:quiz_id>', methods=['POST'])
+def import_questions(quiz_id):
+    if session.get('admin_logged_in'):
+        Quiz.query.get_or_404(quiz_id)
+        upload = request.files.get('question_file')
+        if not upload or not upload.filename:
+            flash('Please choose a CSV or JSON file to import.', 'error')
+            return redirect(url_for('admin.add_questions', quiz_id=quiz_id))
+
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        try:
+            count = question_bank.import_questions(quiz_id, question_bank.iter_rows(stream, upload.filename))
+        except question_bank.QuestionImportError as e:
+            flash('Import failed, no questions were added. ' + ' '.join(e.errors), 'error')
+            return redirect(url_for('admin.add_questions', quiz_id=quiz_id))
+        except (ValueError, UnicodeDecodeError) as e:
+            flash(f'Import failed, the file could not be read: {e}', 'error')
+            return redirect(url_for('admin.add_questions', quiz_id=quiz_id))
+
+        flash(f'{count} questions imported successfully!', 'success')
+        return redirect(url_for('admin.manage_quiz_questions', quiz_id=quiz_id))
+    else:
+        flash('Please log in as Admin to access this page.', 'error')
+        return redirect(url_for('admin.login'))
+
+# Export Questions as a streamed CSV or JSON Lines download
+@bp.route('/export_questions/<int:quiz_id>', methods=['GET'])
+def export_questions(quiz_id):
+    if session.get('admin_logged_in'):
+        Quiz.query.get_or_404(quiz_id)
+        if request.args.get('format') == 'json':
+            body, mimetype, extension = question_bank.export_json(quiz_id), 'application/x-ndjson', 'jsonl'
+        else:
+            body, mimetype, extension = question_bank.export_csv(quiz_id), 'text/csv', 'csv'
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename=quiz_{quiz_id}_questions.{extension}'}
+        )
+    else:
+        flash('Please log in as Admin to access this page.', 'error')
+        return redirect(url_for('admin.login'))
+
 # Edit Question
 @bp.route('/edit_question/<int:question_id>', methods=['GET', 'POST'])
 def edit_question(question_id):
     if session.get('admin_logged_in'):
         question = Question.query.get_or_404(question_id)
         if request.method == 'POST':
+            if request.form['correct_option'] not in VALID_OPTIONS:
+                flash('The correct option must be 1, 2, 3 or 4.', 'error')
+                return redirect(url_for('admin.edit_question', question_id=question_id))
             question.question_text = request.form['question_text']
             question.option_1 = request.form['option_1']
             question.option_2 = request.form['option_2']
@@ -206,6 +264,7 @@ def edit_question(question_id):
             question.option_4 = request.form['option_4']
             question.correct_option = int(request.form['correct_option'])
 
+            catalog.bump_version()
             db.session.commit()
             flash('Question updated successfully!', 'success')
             return redirect(url_for('admin.manage_quiz_questions', quiz_id=question.quiz_id))
@@ -221,6 +280,7 @@ def delete_question(question_id):
     if session.get('admin_logged_in'):
         question = Question.query.get_or_404(question_id)
         db.session.delete(question)
+        catalog.bump_version()
         db.session.commit()
 
         flash('Question deleted successfully!', 'success')
@@ -244,15 +304,11 @@ def manage_quiz_questions(quiz_id):
 @bp.route('/delete_quiz/<int:quiz_id>', methods=['POST'])
 def delete_quiz(quiz_id):
     if session.get('admin_logged_in'):
-        quiz = Quiz.query.get_or_404(quiz_id)
-
-        # Delete all questions related to the quiz
-        questions = Question.query.filter_by(quiz_id=quiz_id).all()
-        for question in questions:
-            db.session.delete(question)
+        Quiz.query.get_or_404(quiz_id)
 
-        # Delete the quiz itself
-        db.session.delete(quiz)
+        # Delete the quiz with its questions and attempts in set-based statements
+        deletion.delete_quiz(quiz_id)
+        catalog.bump_version()
         db.session.commit()
 
         flash('Quiz and all associated questions deleted successfully!', 'success')
@@ -265,73 +321,143 @@ def delete_quiz(quiz_id):
 @bp.route('/user_progress', methods=['GET'])
 def user_progress():
     if session.get('admin_logged_in'):
-        # Fetch user progress data with subject name
-        progress_data = db.session.query(
-            User.full_name,
-            Subject.name.label('subject_name'),
-            Quiz.title,
-            UserQuizProgress.score,
-            UserQuizProgress.completed_on
-        ).join(UserQuizProgress, User.id == UserQuizProgress.user_id)\
-         .join(Quiz, Quiz.id == UserQuizProgress.quiz_id)\
-         .join(Chapter, Quiz.chapter_id == Chapter.id)\
-         .join(Subject, Chapter.subject_id == Subject.id).all()
-
-        return render_template('admin/user_progress.html', progress_data=progress_data)
+        try:
+            filters = progress_report.parse_filters(request.args)
+            # Fetch one page of user progress data with subject name
+            progress_data, next_cursor = progress_report.progress_page(filters, cursor=request.args.get('cursor'))
+        except ValueError:
+            flash('Invalid progress filter.', 'error')
+            return redirect(url_for('admin.user_progress'))
+
+        filter_args = {k: v for k, v in request.args.items() if k in ('subject_id', 'quiz_id', 'date_from', 'date_to') and v}
+        return render_template('admin/user_progress.html', progress_data=progress_data, next_cursor=next_cursor,
+                               filter_args=filter_args, subjects=catalog.get_tree())
     else:
         flash('Please log in as Admin to access this page.', 'error')
         return redirect(url_for('admin.login'))
 
-# User Progress Data for Charting
+# User Progress Data for Charting, one cursor page at a time
 @bp.route('/user_progress_data', methods=['GET'])
 def user_progress_data():
     if session.get('admin_logged_in'):
-        # Fetch user progress data for chart
-        progress_data = db.session.query(
-            User.full_name,
-            Subject.name.label('subject_name'),
-            Quiz.title,
-            UserQuizProgress.score,
-            UserQuizProgress.completed_on
-        ).join(UserQuizProgress, User.id == UserQuizProgress.user_id)\
-         .join(Quiz, Quiz.id == UserQuizProgress.quiz_id)\
-         .join(Chapter, Quiz.chapter_id == Chapter.id)\
-         .join(Subject, Chapter.subject_id == Subject.id).all()
+        try:
+            filters = progress_report.parse_filters(request.args)
+            progress_data, next_cursor = progress_report.progress_page(
+                filters,
+                cursor=request.args.get('cursor'),
+                limit=request.args.get('limit', progress_report.PAGE_SIZE, type=int)
+            )
+        except ValueError:
+            return jsonify({"error": "Invalid filter or cursor"}), 400
 
         # Prepare data for the chart
         data = {
-            "users": [p[0] for p in progress_data],
-            "subjects": [p[1] for p in progress_data],
-            "quizzes": [p[2] for p in progress_data],
-            "scores": [p[3] for p in progress_data],
-            "completion_dates": [p[4].strftime('%Y-%m-%d') for p in progress_data]
+            "users": [p.full_name for p in progress_data],
+            "subjects": [p.subject_name for p in progress_data],
+            "quizzes": [p.title for p in progress_data],
+            "scores": [p.score for p in progress_data],
+            "completion_dates": [p.completed_on.strftime('%Y-%m-%d') for p in progress_data],
+            "next_cursor": next_cursor
         }
 
         return jsonify(data)
     else:
         return jsonify({"error": "Unauthorized access"}), 403
 
+# User Progress Export, streamed as CSV or NDJSON
+@bp.route('/user_progress_export', methods=['GET'])
+def user_progress_export():
+    if session.get('admin_logged_in'):
+        try:
+            filters = progress_report.parse_filters(request.args)
+        except ValueError:
+            return jsonify({"error": "Invalid filter"}), 400
+
+        if request.args.get('format') == 'ndjson':
+            body, mimetype, extension = progress_report.export_ndjson(filters), 'application/x-ndjson', 'ndjson'
+        else:
+            body, mimetype, extension = progress_report.export_csv(filters), 'text/csv', 'csv'
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename=user_progress.{extension}'}
+        )
+    else:
+        flash('Please log in as Admin to access this page.', 'error')
+        return redirect(url_for('admin.login'))
+
 # User Performance Data for Charting
 @bp.route('/user_performance_data', methods=['GET'])
 def user_performance_data():
     if session.get('admin_logged_in'):
-        # Fetch user performance data for the chart
-        performance_data = db.session.query(
-            User.full_name,
-            db.func.avg(UserQuizProgress.score).label('average_score')
-        ).join(UserQuizProgress, User.id == UserQuizProgress.user_id)\
-         .group_by(User.full_name).all()
+        # Fetch user performance data for the chart from the rollup table (one row per user)
+        performance_data = analytics.user_averages()
 
         # Prepare data for the chart
         data = {
-            "users": [p[0] for p in performance_data],
-            "average_scores": [p[1] for p in performance_data]
+            "user_ids": [p[0] for p in performance_data],
+            "users": [p[1] for p in performance_data],
+            "average_scores": [p[2] for p in performance_data]
         }
 
         return jsonify(data)
     else:
         return jsonify({"error": "Unauthorized access"}), 403
 
+# Subject and Daily Activity Data for Charting
+@bp.route('/analytics_data', methods=['GET'])
+def analytics_data():
+    if session.get('admin_logged_in'):
+        subject_data = analytics.subject_averages()
+        daily_data = analytics.daily_activity()
+
+        # Prepare data for the charts
+        data = {
+            "subjects": [p[0] for p in subject_data],
+            "subject_average_scores": [p[1] for p in subject_data],
+            "subject_attempts": [p[2] for p in subject_data],
+            "days": [p[0].strftime('%Y-%m-%d') for p in daily_data],
+            "daily_average_scores": [p[1] for p in daily_data],
+            "daily_attempts": [p[2] for p in daily_data]
+        }
+
+        return jsonify(data)
+    else:
+        return jsonify({"error": "Unauthorized access"}), 403
+
+# Leaderboard pages for the admin, any board and offset
+@bp.route('/leaderboard_data/<scope>', defaults={'scope_id': 0}, methods=['GET'])
+@bp.route('/leaderboard_data/<scope>/<int:scope_id>', methods=['GET'])
+def leaderboard_data(scope, scope_id):
+    if session.get('admin_logged_in'):
+        if scope not in leaderboards.SCOPES or (scope == 'global') != (scope_id == 0):
+            return jsonify({"error": "Unknown leaderboard"}), 404
+        return jsonify(leaderboards.top(
+            scope, scope_id,
+            limit=request.args.get('limit', 25, type=int),
+            offset=request.args.get('offset', 0, type=int)
+        ))
+    else:
+        return jsonify({"error": "Unauthorized access"}), 403
+
+# Item Analysis for the questions of a quiz
+@bp.route('/item_analysis/<int:quiz_id>', methods=['GET'])
+def item_analysis_report(quiz_id):
+    if session.get('admin_logged_in'):
+        quiz = catalog.get_quiz_or_404(quiz_id)
+        return render_template('admin/item_analysis.html', quiz=quiz, items=item_analysis.analyse_quiz(quiz_id))
+    else:
+        flash('Please log in as Admin to access this page.', 'error')
+        return redirect(url_for('admin.login'))
+
+@bp.route('/item_analysis_data/<int:quiz_id>', methods=['GET'])
+def item_analysis_data(quiz_id):
+    if session.get('admin_logged_in'):
+        catalog.get_quiz_or_404(quiz_id)
+        return jsonify({"quiz_id": quiz_id, "items": item_analysis.analyse_quiz(quiz_id)})
+    else:
+        return jsonify({"error": "Unauthorized access"}), 403
+
 # Create a New Chapter
 @bp.route('/create_chapter/<int:subject_id>', methods=['GET', 'POST'])
 def create_chapter(subject_id):
@@ -342,6 +468,7 @@ def create_chapter(subject_id):
 
             new_chapter = Chapter(name=chapter_name, description=chapter_description, subject_id=subject_id)
             db.session.add(new_chapter)
+            catalog.bump_version()
             db.session.commit()
 
             flash('Chapter created successfully!', 'success')
@@ -361,6 +488,7 @@ def edit_chapter(chapter_id):
             chapter.name = request.form['name']
             chapter.description = request.form['description']
 
+            catalog.bump_version()
             db.session.commit()
             flash('Chapter updated successfully!', 'success')
             return redirect(url_for('admin.dashboard'))
@@ -374,8 +502,11 @@ def edit_chapter(chapter_id):
 @bp.route('/delete_chapter/<int:chapter_id>', methods=['POST'])
 def delete_chapter(chapter_id):
     if session.get('admin_logged_in'):
-        chapter = Chapter.query.get_or_404(chapter_id)
-        db.session.delete(chapter)
+        Chapter.query.get_or_404(chapter_id)
+
+        # Delete the chapter with its quizzes, questions and attempts in set-based statements
+        deletion.delete_chapter(chapter_id)
+        catalog.bump_version()
         db.session.commit()
 
         flash('Chapter deleted successfully!', 'success')
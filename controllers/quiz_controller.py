@@ -1,9 +1,59 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, request, jsonify, url_for
+from flask_login import login_required, current_user
 from models import db
 from models.quiz import Quiz  # Import only the Quiz model
+from services import catalog, quiz_sessions, submissions
+from services.answer_key import VALID_OPTIONS
 
 bp = Blueprint('quiz', __name__)
 
 @bp.route('/')
 def quiz_home():
     return "Welcome to the Quiz Section"
+
+
+# JSON submission API: grade, queue and return a submission id without waiting for the commit.
+# Accepts {"session_token": ..., "answers": {question_id: option}} or the start_quiz form fields.
+@bp.route('/api/quizzes/<int:quiz_id>/submissions', methods=['POST'])
+@login_required
+def api_submit(quiz_id):
+    if catalog.get_quiz(quiz_id) is None:
+        return jsonify({'error': 'Quiz not found'}), 404
+
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        answers = data.get('answers') or {}
+        session_token = data.get('session_token', '')
+    else:
+        answers = {name[len('question_'):]: value for name, value in request.form.items()
+                   if name.startswith('question_')}
+        session_token = request.form.get('session_token', '')
+    if not isinstance(answers, dict):
+        return jsonify({'error': 'answers must be an object'}), 400
+    try:
+        answers = {question_id: int(answer) for question_id, answer in answers.items()
+                   if str(answer) in VALID_OPTIONS and str(question_id).isdigit()}
+        submission_id, late = submissions.submit(current_user.id, quiz_id, session_token, answers)
+    except quiz_sessions.QuizSessionError as e:
+        return jsonify({'error': str(e)}), 409
+
+    return jsonify({
+        'submission_id': submission_id,
+        'status': 'pending',
+        'late': late,
+        'result_url': url_for('quiz.api_result', submission_id=submission_id),
+    }), 202
+
+
+# Poll for a result; ?wait=N long-polls up to N seconds for the commit
+@bp.route('/api/submissions/<submission_id>')
+@login_required
+def api_result(submission_id):
+    try:
+        wait = max(0.0, float(request.args.get('wait', 0)))
+        result = submissions.result(current_user.id, submission_id, wait)
+    except ValueError:
+        return jsonify({'error': 'Invalid submission id'}), 400
+    if result['status'] == 'rejected':
+        return jsonify(result), 422
+    return jsonify(result), 200 if result['status'] == 'graded' else 202
@@ -1,27 +1,21 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, jsonify
+from markupsafe import Markup
+from flask_login import login_user, logout_user, login_required, current_user
 from models import db
 from models.user import User
-from models.subject import Subject
-from models.chapter import Chapter
-
-from models.quiz import Quiz, Question,UserQuizProgress
+from models.quiz import UserQuizProgress
+from models.quiz_session import QuizSession
+from services import catalog, identity, leaderboards, quiz_sessions, randomizer
+from services.passwords import hash_password, check_password, HashQueueFull, HashTimeout
+from services.rate_limit import get_limiter
+from services.answer_key import get_answer_key, get_question_set, decode_answers, VALID_OPTIONS
+from services.submission_queue import record_attempt, SubmissionRejected
+from services.dashboard import load_progress, load_summary
+from services.fragments import render_fragment, conditional_response, make_etag
 from datetime import datetime
 
 bp = Blueprint('user', __name__)
 
-# Initialize LoginManager
-login_manager = LoginManager()
-
-from sqlalchemy.orm import Session
-
-@login_manager.user_loader
-def load_user(user_id):
-    return db.session.get(User, int(user_id))  # Use session.get for SQLAlchemy 2.0+
-
-
-
 @bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
@@ -31,6 +25,10 @@ def register():
         qualification = request.form['qualification']
         dob = request.form['dob']
 
+        if not get_limiter('REGISTER_RATE_LIMIT_PER_IP').hit(f'ip:{request.remote_addr}'):
+            flash('Too many attempts. Please wait a moment and try again.', 'error')
+            return redirect(url_for('user.register'))
+
         # Convert dob (string) to a datetime.date object
         try:
             dob_date = datetime.strptime(dob, '%Y-%m-%d').date()
@@ -43,8 +41,12 @@ def register():
             flash('Username already exists. Please choose a different one.', 'error')
             return redirect(url_for('user.register'))
 
-        # Use a valid hash method for the password
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+        # Hashed in the password pool with the configured method and cost
+        try:
+            hashed_password = hash_password(password)
+        except (HashQueueFull, HashTimeout):
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return redirect(url_for('user.register'))
 
         # Create and save the new user
         new_user = User(
@@ -69,12 +71,27 @@ def login():
         username = request.form['username']
         password = request.form['password']
 
+        # Throttle per account and per client before doing any hashing work. Only failed logins
+        # count against the client, so many users behind one address can still sign in.
+        user_key, ip_key = f'user:{username}', f'ip:{request.remote_addr}'
+        if (get_limiter('LOGIN_RATE_LIMIT_PER_IP').exceeded(ip_key)
+                or not get_limiter('LOGIN_RATE_LIMIT_PER_USER').hit(user_key)):
+            flash('Too many login attempts. Please wait a few minutes and try again.', 'error')
+            return render_template('login.html'), 429
+
         user = User.query.filter_by(username=username).first()
-        if user and check_password_hash(user.password, password):
+        try:
+            valid = user is not None and check_password(user.password, password)
+        except (HashQueueFull, HashTimeout):
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('login.html'), 503
+        if valid:
+            get_limiter('LOGIN_RATE_LIMIT_PER_USER').reset(user_key)
             login_user(user)
             flash('Logged in successfully!', 'success')
             return redirect(url_for('user.dashboard'))
         else:
+            get_limiter('LOGIN_RATE_LIMIT_PER_IP').hit(ip_key)
             flash('Invalid username or password.', 'error')
 
     return render_template('login.html')
@@ -82,49 +99,73 @@ def login():
 @bp.route('/')
 @login_required
 def dashboard():
-    subjects = Subject.query.all()
-    chapters = Chapter.query.all()
-    for chapter in chapters:
-        chapter.quizzes = Quiz.query.filter_by(chapter_id=chapter.id).all()
-        for quiz in chapter.quizzes:
-            progress = UserQuizProgress.query.filter_by(user_id=current_user.id, quiz_id=quiz.id).first()
-            if progress:
-                quiz.score = progress.score
-                quiz.completed = True
-            else:
-                quiz.score = None
-                quiz.completed = False
-    return render_template('user_dashboard.html', subjects=subjects, name=current_user.full_name, user_id=current_user.id)
+    # Catalog fragment rendered once per catalog version; this user's scores come from one query
+    catalog_html = render_fragment(('dashboard',), 'fragments/dashboard_catalog.html', subjects=catalog.get_tree())
+    return render_template('user_dashboard.html', catalog_html=catalog_html, progress=load_progress(current_user.id),
+                           name=current_user.full_name, user_id=current_user.id,
+                           subjects=[(subject['id'], subject['name']) for subject in catalog.get_tree()])
+
+
+# Top of a global, subject or quiz leaderboard and the current user's rank on it
+@bp.route('/leaderboard/<scope>', defaults={'scope_id': 0})
+@bp.route('/leaderboard/<scope>/<int:scope_id>')
+@login_required
+def leaderboard(scope, scope_id):
+    if scope not in leaderboards.SCOPES or (scope == 'global') != (scope_id == 0):
+        return jsonify({'error': 'Unknown leaderboard'}), 404
+    data = leaderboards.top(scope, scope_id, limit=request.args.get('limit', 10, type=int))
+    data['me'] = leaderboards.rank_of(scope, scope_id, current_user.id)
+    return jsonify(data)
 
 
 @bp.route('/logout')
 @login_required
 def logout():
+    identity.invalidate(current_user.id)
     logout_user()
     flash('You have been logged out.', 'success')
     return redirect(url_for('user.login'))
 
-@bp.route('/start_quiz/<int:quiz_id>', methods=['GET', 'POST'])
+# Attempts are submitted to submit_quiz with their session token, never back to this page
+@bp.route('/start_quiz/<int:quiz_id>', methods=['GET'])
 @login_required
 def start_quiz(quiz_id):
-    quiz = Quiz.query.get_or_404(quiz_id)
-    questions = Question.query.filter_by(quiz_id=quiz.id).all()
-
-    if request.method == 'POST':
-        score = 0
-        for question in questions:
-            user_answer = request.form.get(f"question_{question.id}")
-            if user_answer and int(user_answer) == question.correct_option:
-                score += 1
-    
-
-        # Handle user progress (optional)
-        flash(f'You scored {score}/{len(questions)} in the quiz.', 'success')
-        return redirect(url_for('user.dashboard'))
-
-    return render_template('start_quiz.html', quiz=quiz, questions=questions)
+    quiz = catalog.get_quiz_or_404(quiz_id)
+    questions = catalog.get_questions(quiz_id)
+
+    # Resume the running attempt after a reload, otherwise start the clock now
+    quiz_session = quiz_sessions.start_session(current_user.id, quiz)
+    if quiz_session['question_set_id'] is not None:
+        # Randomized attempt: its own questions and option order, rendered per attempt
+        served = randomizer.served_questions(quiz, quiz_session['question_set_id'], quiz_session['seed'])
+        questions_html = Markup(render_template('fragments/quiz_questions.html', questions=served))
+    else:
+        questions_html = render_fragment(('questions', quiz_id), 'fragments/quiz_questions.html', questions=questions)
+    return render_template('start_quiz.html', quiz=quiz, questions_html=questions_html,
+                           session_token=quiz_session['token'],
+                           remaining=quiz_sessions.remaining_seconds(quiz_session),
+                           saved_answers=quiz_session['answers'],
+                           heartbeat_interval=current_app.config.get('QUIZ_HEARTBEAT_INTERVAL', 20))
 
 
+# Autosave for a running quiz; answers stay in memory and are written back in batches
+@bp.route('/quiz_session/<token>/heartbeat', methods=['POST'])
+@login_required
+def quiz_heartbeat(token):
+    data = request.get_json(silent=True) or {}
+    answers = data.get('answers')  # Omitted when nothing changed since the last heartbeat
+    if answers is not None:
+        if not isinstance(answers, dict):
+            return jsonify({'error': 'answers must be an object'}), 400
+        answers = {str(question_id): int(answer) for question_id, answer in answers.items()
+                   if str(answer) in VALID_OPTIONS and str(question_id).isdigit()}
+    try:
+        remaining = quiz_sessions.heartbeat(token, current_user.id, answers)
+    except quiz_sessions.SessionExpired as e:
+        return jsonify({'error': str(e), 'expired': True}), 409
+    except quiz_sessions.QuizSessionError as e:
+        return jsonify({'error': str(e)}), 404
+    return jsonify({'remaining': remaining})
 
 
 # @bp.route('/submit_quiz/<int:quiz_id>', methods=['POST'])
@@ -177,52 +218,45 @@ def start_quiz(quiz_id):
 @bp.route('/submit_quiz/<int:quiz_id>', methods=['POST'])
 @login_required
 def submit_quiz(quiz_id):
-    quiz = Quiz.query.get_or_404(quiz_id)
-    questions = Question.query.filter_by(quiz_id=quiz_id).all()
-
-    # Fetch user answers from the form
-    user_answers = {}
-    for question in questions:
-        answer = request.form.get(f'question_{question.id}')
-        if answer:
-            user_answers[question.id] = int(answer)  # Convert to integer
-        else:
-            user_answers[question.id] = None  # Unanswered questions are marked as None
-
-    # Calculate the score (treat unanswered questions as incorrect)
-    score = 0
-    for question in questions:
-        user_answer = user_answers[question.id]
-        if user_answer and user_answer == question.correct_option:
-            score += 1
-
-    # Save the score and answers in the database
-    user_progress = UserQuizProgress.query.filter_by(user_id=current_user.id, quiz_id=quiz_id).first()
-    if not user_progress:
-        user_progress = UserQuizProgress(
-            user_id=current_user.id,
-            quiz_id=quiz_id,
-            score=(score / len(questions)) * 100 if questions else 0,  # Handle empty quiz case
-            completed_on=datetime.now(),
-            user_answers=user_answers  # Save user answers
-        )
-        db.session.add(user_progress)
-    else:
-        user_progress.score = (score / len(questions)) * 100 if questions else 0
-        user_progress.completed_on = datetime.now()
-        user_progress.user_answers = user_answers  # Update user answers
+    catalog.get_quiz_or_404(quiz_id)
 
-    db.session.commit()
+    # The session token is single use and carries the server-side deadline
+    try:
+        quiz_session, late = quiz_sessions.finish(request.form.get('session_token', ''), current_user.id, quiz_id)
+    except quiz_sessions.QuizSessionError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('user.dashboard'))
+    # Randomized attempts are graded on the questions they were served
+    answer_key = get_answer_key(quiz_id, quiz_session['question_set_id'])
+
+    # Grade against the precompiled answer key (unanswered questions count as incorrect).
+    # Past the deadline only the answers autosaved in time count.
+    if late:
+        answers = answer_key.answers_from_dict(quiz_session['answers'])
+    else:
+        answers = answer_key.answers_from_form(request.form)
+    score = answer_key.score(answers)
 
-    flash('Quiz submitted successfully! Your score has been updated.', 'success')
+    # Hand the attempt to the write-behind queue, which commits it in a batch
+    if late:
+        flash('Time was up. Your answers saved before the deadline have been graded.', 'error')
+    try:
+        committed = record_attempt(current_user.id, quiz_id, score, answer_key.question_set_id, answers.tobytes())
+    except SubmissionRejected:
+        flash('Your attempt could not be saved because this quiz has changed. Please contact an administrator.', 'error')
+        return redirect(url_for('user.dashboard'))
+    if committed:
+        flash('Quiz submitted successfully! Your score has been updated.', 'success')
+    else:
+        flash('Quiz submitted successfully! Your score will appear shortly.', 'success')
     return redirect(url_for('user.dashboard'))
 
 
 @bp.route('/view_quiz/<int:quiz_id>', methods=['GET'])
 @login_required
 def view_quiz(quiz_id):
-    quiz = Quiz.query.get_or_404(quiz_id)
-    questions = Question.query.filter_by(quiz_id=quiz.id).all()
+    quiz = catalog.get_quiz_or_404(quiz_id)
+    questions = catalog.get_questions(quiz_id)
 
     # Fetch progress data
     progress = UserQuizProgress.query.filter_by(user_id=current_user.id, quiz_id=quiz_id).first()
@@ -230,24 +264,43 @@ def view_quiz(quiz_id):
         flash('You have not completed this quiz yet.', 'error')
         return redirect(url_for('user.dashboard'))
 
-    # Parse user_answers from progress (JSON field)
-    user_answers = progress.user_answers or {}
+    def render():
+        # {question_id: option} decoded from the packed answers of the attempt
+        user_answers = decode_answers(progress.question_set_id, progress.answers, progress.user_answers)
+
+        # Questions in the order the attempt served them (a randomized attempt may cover a subset);
+        # the order comes from the seed of the quiz session that submitted this question set
+        if progress.answers is not None and randomizer.is_randomized(quiz):
+            seed = db.session.query(QuizSession.seed).filter(
+                QuizSession.user_id == current_user.id, QuizSession.quiz_id == quiz_id,
+                QuizSession.question_set_id == progress.question_set_id, QuizSession.submitted_on.isnot(None)
+            ).order_by(QuizSession.submitted_on.desc()).limit(1).scalar()
+            served = randomizer.served_questions(quiz, progress.question_set_id, seed)
+        elif progress.answers is not None:
+            by_id = {question['id']: question for question in questions}
+            served = [by_id[question_id] for question_id in get_question_set(progress.question_set_id) if question_id in by_id]
+        else:
+            served = questions
+
+        # Process each question to include text, user answer, and correct answer
+        processed_questions = []
+        for question in served:
+            user_answer_id = user_answers.get(question['id'], 0)
+            user_answer_text = question.get(f"option_{user_answer_id}", "Not Answered")  # Retrieve user answer text
+            correct_answer_text = question[f"option_{question['correct_option']}"]  # Retrieve correct answer text
 
-    # Process each question to include text, user answer, and correct answer
-    processed_questions = []
-    for question in questions:
-        user_answer_id = int(user_answers.get(str(question.id), 0))  # Convert user answer ID to int
-        user_answer_text = getattr(question, f"option_{user_answer_id}", "Not Answered")  # Retrieve user answer text
-        correct_answer_text = getattr(question, f"option_{question.correct_option}")  # Retrieve correct answer text
+            processed_questions.append({
+                "text": question['question_text'],
+                "user_answer": user_answer_text,
+                "correct_answer": correct_answer_text,
+            })
 
-        processed_questions.append({
-            "text": question.question_text,
-            "user_answer": user_answer_text,
-            "correct_answer": correct_answer_text,
-        })
+        # Render the template with processed questions
+        return render_template('view_quiz.html', quiz=quiz, processed_questions=processed_questions, progress=progress)
 
-    # Render the template with processed questions
-    return render_template('view_quiz.html', quiz=quiz, processed_questions=processed_questions, progress=progress)
+    # The page only changes with this attempt or the catalog, so repeat loads get a 304
+    etag = make_etag('view_quiz', current_user.id, progress.id, progress.completed_on, catalog.current_version())
+    return conditional_response(etag, render, last_modified=progress.completed_on)
 
 # @bp.route('/user_summary')
 # @login_required
@@ -270,7 +323,6 @@ def view_quiz(quiz_id):
 #                 })
 #         summary_data.append(subject_data)
 #     return {'summary_data': summary_data}
-from sqlalchemy.orm import load_only
 
 # @bp.route('/user_summary')
 # @login_required
@@ -300,43 +352,17 @@ from sqlalchemy.orm import load_only
 #         summary_data.append(subject_data)
 #     return {'summary_data': summary_data}
 
-from sqlalchemy.orm import joinedload
 import logging
-from flask import jsonify
 
-# Configure logging to see errors in the terminal
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
 @bp.route('/user_summary')
 @login_required
 def user_summary():
     try:
-        user_id = current_user.id
-        # Use joinedload to eagerly load the chapters relationship
-        subjects = Subject.query.options(joinedload(Subject.chapters)).all()
-        summary_data = []
-        for subject in subjects:
-            subject_data = {
-                'subject_name': subject.name,
-                'quizzes': []
-            }
-            # Loop through chapters (now properly loaded)
-            for chapter in subject.chapters:
-                # Fetch quizzes with progress for this user and chapter
-                quizzes = Quiz.query.join(UserQuizProgress, Quiz.id == UserQuizProgress.quiz_id).filter(
-                    UserQuizProgress.user_id == user_id, Quiz.chapter_id == chapter.id
-                ).all()
-                for quiz in quizzes:
-                    progress = UserQuizProgress.query.filter_by(user_id=user_id, quiz_id=quiz.id).first()
-                    subject_data['quizzes'].append({
-                        'quiz_title': quiz.title,
-                        'score': progress.score if progress else 0
-                    })
-            # Include subjects even if no quizzes exist
-            if not subject_data['quizzes']:
-                subject_data['quizzes'].append({'quiz_title': 'No Quizzes', 'score': 0})
-            summary_data.append(subject_data)
-        return {'summary_data': summary_data}
+        # Single grouped query, served from the per-user cache on repeat loads
+        summary_data, etag = load_summary(current_user.id)
+        return conditional_response(etag, lambda: {'summary_data': summary_data})
     except Exception as e:
-        logging.error(f"Error in user_summary: {str(e)}", exc_info=True)
+        logger.error(f"Error in user_summary: {str(e)}", exc_info=True)
         return jsonify({'error': 'Failed to load summary data'}), 500
\ No newline at end of file
@@ -0,0 +1,71 @@
+from models import db
+
+# Rollup tables for the admin charts, maintained incrementally as attempts are committed.
+# UserStats, QuizStats and SubjectStats summarise the current UserQuizProgress rows (a retake
+# replaces the old score). DailyStats counts submissions per day, retakes included.
+
+
+class UserStats(db.Model):
+    __tablename__ = 'user_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+
+
+class QuizStats(db.Model):
+    __tablename__ = 'quiz_stats'
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id', ondelete='CASCADE'), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+
+
+class SubjectStats(db.Model):
+    __tablename__ = 'subject_stats'
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id', ondelete='CASCADE'), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+
+
+class DailyStats(db.Model):
+    __tablename__ = 'daily_stats'
+    day = db.Column(db.Date, primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+
+
+# Sufficient statistics for item analysis of one question over the current attempts.
+# chosen_k counts attempts that picked option k (0 = unanswered) and score_sum_k sums their
+# attempt scores, so difficulty, discrimination and distractor figures follow from one row
+# whichever option is currently marked correct.
+class ItemStats(db.Model):
+    __tablename__ = 'item_stats'
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id', ondelete='CASCADE'), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+    score_sq_sum = db.Column(db.Float, nullable=False, default=0)
+    chosen_0 = db.Column(db.Integer, nullable=False, default=0)
+    chosen_1 = db.Column(db.Integer, nullable=False, default=0)
+    chosen_2 = db.Column(db.Integer, nullable=False, default=0)
+    chosen_3 = db.Column(db.Integer, nullable=False, default=0)
+    chosen_4 = db.Column(db.Integer, nullable=False, default=0)
+    score_sum_0 = db.Column(db.Float, nullable=False, default=0)
+    score_sum_1 = db.Column(db.Float, nullable=False, default=0)
+    score_sum_2 = db.Column(db.Float, nullable=False, default=0)
+    score_sum_3 = db.Column(db.Float, nullable=False, default=0)
+    score_sum_4 = db.Column(db.Float, nullable=False, default=0)
+
+
+# Leaderboard points of one user on one board: scope 'global' (scope_id 0), 'subject' or 'quiz'.
+# points sums the user's current scores within the scope and attempts counts them, so a
+# quiz board holds each user's latest score and the global board their total.
+class LeaderboardEntry(db.Model):
+    __tablename__ = 'leaderboard_entry'
+    __table_args__ = (
+        # Loads a whole board in rank order
+        db.Index('ix_leaderboard_entry_board_points', 'scope', 'scope_id', 'points'),
+    )
+    scope = db.Column(db.String(10), primary_key=True)
+    scope_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    points = db.Column(db.Float, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
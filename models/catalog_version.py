@@ -0,0 +1,9 @@
+from models import db
+
+
+# Single-row counter bumped by every admin write to the Subject/Chapter/Quiz/Question catalog.
+# It lives in the database so every worker process sees the same version.
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
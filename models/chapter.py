@@ -4,6 +4,6 @@ from models import db
 class Chapter(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
-    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id', ondelete='CASCADE'), nullable=False, index=True)
     description = db.Column(db.Text, nullable=True)
-    quizzes = db.relationship('Quiz', backref='chapter', lazy=True)  # Add this line to establish the relationship
+    quizzes = db.relationship('Quiz', backref='chapter', lazy=True, cascade='all, delete-orphan', passive_deletes=True)  # Add this line to establish the relationship
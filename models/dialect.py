@@ -0,0 +1,10 @@
+from models import db
+
+
+# INSERT construct with ON CONFLICT support for the bound backend (SQLite or PostgreSQL)
+def upsert_insert(model):
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
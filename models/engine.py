@@ -0,0 +1,58 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from models import db
+
+
+# Normalise DATABASE_URL values such as Heroku's postgres:// scheme
+def database_uri(url):
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def _in_memory_sqlite(url):
+    return url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+
+
+# SQLAlchemy engine options for the configured backend
+def engine_options(config):
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = {}
+    # In-memory SQLite runs on a single shared connection (StaticPool), which takes no sizing options
+    if not (url.get_backend_name() == 'sqlite' and _in_memory_sqlite(url)):
+        options.update(
+            pool_size=config.get('DB_POOL_SIZE', 10),
+            max_overflow=config.get('DB_MAX_OVERFLOW', 20),
+            pool_timeout=config.get('DB_POOL_TIMEOUT', 30),
+        )
+    if url.get_backend_name() == 'sqlite':
+        # Wait on the write lock instead of failing immediately
+        options['connect_args'] = {'timeout': config.get('SQLITE_PRAGMAS', {}).get('busy_timeout', 5000) / 1000}
+    else:
+        # Server connections can be dropped by the network or the server between requests
+        options['pool_pre_ping'] = True
+        options['pool_recycle'] = config.get('DB_POOL_RECYCLE', 1800)
+    return options
+
+
+def _apply_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return on_connect
+
+
+# Bind the database to the app using the engine profile from the app config.
+# SQLite connections get the configured pragmas (WAL, synchronous, mmap, cache, busy timeout).
+def init_engine(app):
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+    options = engine_options(app.config)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    db.init_app(app)
+
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _apply_pragmas(app.config.get('SQLITE_PRAGMAS', {})))
@@ -0,0 +1,54 @@
+import hashlib
+import sys
+from array import array
+from sqlalchemy import select
+from models import db
+
+
+# The ordered question ids of a quiz at the time attempts were graded.
+# UserQuizProgress.answers stores one byte per question aligned to this order (0 = unanswered),
+# so attempts no longer repeat the question ids. A quiz gets a new set whenever its questions
+# change; sets are immutable once written.
+class QuestionSet(db.Model):
+    __tablename__ = 'question_set'
+    __table_args__ = (
+        db.UniqueConstraint('quiz_id', 'digest', name='uq_question_set_quiz_digest'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id', ondelete='CASCADE'), nullable=False)
+    digest = db.Column(db.String(40), nullable=False)
+    question_ids = db.Column(db.LargeBinary, nullable=False)  # Little-endian int64 ids
+
+
+def pack_question_ids(question_ids):
+    packed = array('q', question_ids)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_question_ids(data):
+    question_ids = array('q')
+    question_ids.frombytes(data)
+    if sys.byteorder == 'big':
+        question_ids.byteswap()
+    return question_ids
+
+
+# Id of the set holding exactly these question ids, inserting it if needed.
+# Runs on the given connection so callers can keep it out of the request's session.
+def question_set_id(connection, quiz_id, question_ids):
+    packed = pack_question_ids(question_ids)
+    digest = hashlib.sha1(packed).hexdigest()
+    table = QuestionSet.__table__
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    connection.execute(
+        insert(table).values(quiz_id=quiz_id, digest=digest, question_ids=packed)
+        .on_conflict_do_nothing(index_elements=['quiz_id', 'digest'])
+    )
+    return connection.execute(
+        select(table.c.id).where(table.c.quiz_id == quiz_id, table.c.digest == digest)
+    ).scalar_one()
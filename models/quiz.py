@@ -1,18 +1,21 @@
 from models import db
-from sqlalchemy.dialects.postgresql import JSON
 from datetime import datetime
 
 class Quiz(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(120), nullable=False)
-    chapter_id = db.Column(db.Integer, db.ForeignKey('chapter.id'), nullable=False)  # Ensure chapter_id is used
+    chapter_id = db.Column(db.Integer, db.ForeignKey('chapter.id', ondelete='CASCADE'), nullable=False, index=True)  # Ensure chapter_id is used
     date = db.Column(db.Date, nullable=False)
     duration = db.Column(db.Integer, nullable=False)
-    questions = db.relationship('Question', backref='quiz', lazy=True)
+    # Randomized delivery: serve sample_size questions per attempt (all when empty) and
+    # shuffle question and option order per attempt
+    sample_size = db.Column(db.Integer, nullable=True)
+    shuffle = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    questions = db.relationship('Question', backref='quiz', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
 
 class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id', ondelete='CASCADE'), nullable=False, index=True)
     question_text = db.Column(db.Text, nullable=False)
     option_1 = db.Column(db.String(120), nullable=False)
     option_2 = db.Column(db.String(120), nullable=False)
@@ -22,10 +25,21 @@ class Question(db.Model):
 
 class UserQuizProgress(db.Model):
     __tablename__ = 'user_quiz_progress'
+    __table_args__ = (
+        # One row per user and quiz; also serves every lookup by user_id
+        db.UniqueConstraint('user_id', 'quiz_id', name='uq_user_quiz_progress_user_quiz'),
+        db.Index('ix_user_quiz_progress_quiz_id', 'quiz_id'),
+        # Newest-first keyset pagination of the admin progress report
+        db.Index('ix_user_quiz_progress_completed_on', 'completed_on', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id', ondelete='CASCADE'), nullable=False)
     score = db.Column(db.Integer, nullable=False)
     completed_on = db.Column(db.DateTime, nullable=False)
-    user_answers = db.Column(JSON, nullable=True)
+    # One byte per question of the question set (0 = unanswered); see models.question_set
+    question_set_id = db.Column(db.Integer, db.ForeignKey('question_set.id', ondelete='CASCADE'), nullable=True)
+    answers = db.Column(db.LargeBinary, nullable=True)
+    # Legacy {question_id: option} JSON; converted to answers by upgrade-db
+    user_answers = db.Column(db.JSON(none_as_null=True), nullable=True)
 
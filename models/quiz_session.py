@@ -0,0 +1,23 @@
+from models import db
+
+
+# One timed attempt at a quiz. The server records when it started and when it must end, so the
+# deadline does not depend on the browser's clock. answers holds the last autosaved
+# {question_id: option} mapping; submitted_on is set once the attempt has been graded.
+class QuizSession(db.Model):
+    __tablename__ = 'quiz_session'
+    __table_args__ = (
+        db.Index('ix_quiz_session_user_quiz', 'user_id', 'quiz_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(32), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id', ondelete='CASCADE'), nullable=False)
+    started_on = db.Column(db.DateTime, nullable=False)
+    deadline = db.Column(db.DateTime, nullable=False)
+    # Questions drawn for this attempt and the seed of its question and option order
+    question_set_id = db.Column(db.Integer, db.ForeignKey('question_set.id', ondelete='CASCADE'), nullable=True)
+    seed = db.Column(db.Integer, nullable=True)
+    answers = db.Column(db.JSON, nullable=True)
+    saved_on = db.Column(db.DateTime, nullable=True)
+    submitted_on = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,171 @@
+from sqlalchemy import bindparam, inspect, select, text, update
+from models import db
+
+# In-place upgrades for existing quiz_master.db files.
+# db.create_all() only creates missing tables, so indexes and constraints added to
+# existing tables are applied here. Every step is idempotent.
+
+
+def _has_unique(inspector, table, columns):
+    for constraint in inspector.get_unique_constraints(table):
+        if constraint['column_names'] == columns:
+            return True
+    for index in inspector.get_indexes(table):
+        if index['unique'] and index['column_names'] == columns:
+            return True
+    return False
+
+
+# Keep only the latest attempt per user and quiz so the unique index can be built
+def _dedupe_progress():
+    db.session.execute(text("""
+        DELETE FROM user_quiz_progress WHERE id NOT IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, quiz_id ORDER BY completed_on DESC, id DESC
+                ) AS rn
+                FROM user_quiz_progress
+            ) AS ranked WHERE rn = 1
+        )
+    """))
+
+
+def _add_progress_unique_index():
+    if not _has_unique(inspect(db.engine), 'user_quiz_progress', ['user_id', 'quiz_id']):
+        _dedupe_progress()
+        db.session.execute(text(
+            'CREATE UNIQUE INDEX uq_user_quiz_progress_user_quiz ON user_quiz_progress (user_id, quiz_id)'
+        ))
+
+
+# Create every index declared on the models that the database does not have yet
+def _create_missing_indexes():
+    connection = db.session.connection()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+# Full-text index over username and full name for the admin user search.
+# SQLite: an external-content FTS5 table with the trigram tokenizer (substring matches), kept
+# in sync by triggers. PostgreSQL: pg_trgm GIN indexes that serve ILIKE '%term%'.
+def _create_user_search_index():
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        exists = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_search'"
+        )).first()
+        if exists:
+            return
+        statements = [
+            """CREATE VIRTUAL TABLE user_search USING fts5(
+                   username, full_name, content='user', content_rowid='id', tokenize='trigram')""",
+            """CREATE TRIGGER user_search_ai AFTER INSERT ON "user" BEGIN
+                   INSERT INTO user_search(rowid, username, full_name) VALUES (new.id, new.username, new.full_name);
+               END""",
+            """CREATE TRIGGER user_search_ad AFTER DELETE ON "user" BEGIN
+                   INSERT INTO user_search(user_search, rowid, username, full_name)
+                   VALUES ('delete', old.id, old.username, old.full_name);
+               END""",
+            """CREATE TRIGGER user_search_au AFTER UPDATE ON "user" BEGIN
+                   INSERT INTO user_search(user_search, rowid, username, full_name)
+                   VALUES ('delete', old.id, old.username, old.full_name);
+                   INSERT INTO user_search(rowid, username, full_name) VALUES (new.id, new.username, new.full_name);
+               END""",
+            "INSERT INTO user_search(user_search) VALUES ('rebuild')",
+        ]
+    elif dialect == 'postgresql':
+        statements = [
+            'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+            'CREATE INDEX IF NOT EXISTS ix_user_full_name_trgm ON "user" USING gin (full_name gin_trgm_ops)',
+            'CREATE INDEX IF NOT EXISTS ix_user_username_trgm ON "user" USING gin (username gin_trgm_ops)',
+        ]
+    else:
+        return
+    for statement in statements:
+        db.session.execute(text(statement))
+
+
+# Add columns declared on a model that an existing table does not have yet.
+# Columns must be nullable or carry a server default.
+def _add_missing_columns(table_name):
+    table = db.metadata.tables[table_name]
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table_name)}
+    dialect = db.engine.dialect
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        ddl = f'ALTER TABLE {table_name} ADD COLUMN {column.name} {column.type.compile(dialect=dialect)}'
+        if column.server_default is not None:
+            default = column.server_default.arg
+            if not isinstance(default, str):
+                default = default.compile(dialect=dialect)
+            ddl += f' NOT NULL DEFAULT {default}' if not column.nullable else f' DEFAULT {default}'
+        for foreign_key in column.foreign_keys:
+            ddl += f' REFERENCES {foreign_key.column.table.name} ({foreign_key.column.name})'
+            if foreign_key.ondelete:
+                ddl += f' ON DELETE {foreign_key.ondelete}'
+        db.session.execute(text(ddl))
+
+
+# Convert legacy {question_id: option} JSON answers into the packed answers column.
+# Each row gets the question set of the ids it answered; rows are converted in batches.
+def _pack_user_answers(batch_size=1000):
+    from models.quiz import UserQuizProgress
+    from models.question_set import question_set_id
+
+    progress = UserQuizProgress.__table__
+    connection = db.session.connection()
+    set_ids = {}
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(progress.c.id, progress.c.quiz_id, progress.c.user_answers)
+            .where(progress.c.id > last_id, progress.c.answers.is_(None), progress.c.user_answers.isnot(None))
+            .order_by(progress.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        params = []
+        for row_id, quiz_id, user_answers in rows:
+            answers = {int(question_id): int(answer or 0) for question_id, answer in (user_answers or {}).items()}
+            question_ids = tuple(sorted(answers))
+            key = (quiz_id, question_ids)
+            if key not in set_ids:
+                set_ids[key] = question_set_id(connection, quiz_id, question_ids)
+            params.append({
+                'b_id': row_id,
+                'b_set': set_ids[key],
+                'b_answers': bytes(answers[question_id] for question_id in question_ids),
+            })
+        connection.execute(
+            update(progress).where(progress.c.id == bindparam('b_id'))
+            .values(question_set_id=bindparam('b_set'), answers=bindparam('b_answers'), user_answers=None),
+            params
+        )
+        last_id = rows[-1][0]
+
+
+# Register every model on db.metadata
+def import_models():
+    import models.user
+    import models.subject
+    import models.chapter
+    import models.quiz
+    import models.catalog_version
+    import models.analytics
+    import models.quiz_session
+    import models.question_set
+
+
+def upgrade_schema():
+    import_models()
+    db.create_all()
+    _add_progress_unique_index()
+    _add_missing_columns('user_quiz_progress')
+    _add_missing_columns('quiz')
+    _add_missing_columns('quiz_session')
+    _pack_user_answers()
+    _create_missing_indexes()
+    _create_user_search_index()
+    db.session.commit()
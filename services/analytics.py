@@ -0,0 +1,250 @@
+from collections import defaultdict
+from sqlalchemy import delete, func, insert, literal, select, text, tuple_, update
+from models import db
+from models.user import User
+from models.subject import Subject
+from models.chapter import Chapter
+from models.quiz import Quiz, Question, UserQuizProgress
+from models.analytics import UserStats, QuizStats, SubjectStats, DailyStats, ItemStats, LeaderboardEntry
+from models.dialect import upsert_insert
+from services import item_analysis, leaderboards
+
+
+def _add_deltas(model, key_column, deltas):
+    if not deltas:
+        return
+    stmt = upsert_insert(model).values([
+        {key_column: key, 'attempts': attempts, 'score_sum': score_sum}
+        for key, (attempts, score_sum) in deltas.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key_column],
+        set_={
+            'attempts': getattr(model, 'attempts') + stmt.excluded.attempts,
+            'score_sum': getattr(model, 'score_sum') + stmt.excluded.score_sum,
+        },
+    )
+    db.session.execute(stmt)
+
+
+def _lock_writers():
+    # PostgreSQL: serialise rollup maintenance so concurrent flushes cannot read the same old scores
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(text('SELECT pg_advisory_xact_lock(7312)'))
+
+
+# Fold a batch of attempts into the rollup tables.
+# rows holds the latest attempt per user and quiz, as upserted; submitted holds every attempt
+# in the batch, retakes included, for daily activity (defaults to rows).
+# Must run in the flush transaction, before the attempts are upserted into UserQuizProgress.
+def record_attempts(rows, submitted=None):
+    if not rows:
+        return
+    _lock_writers()
+
+    # Daily activity only counts events. On SQLite this first write also takes the write lock,
+    # so the old scores read below cannot change before this transaction commits.
+    daily = defaultdict(lambda: [0, 0.0])
+    for row in submitted or rows:
+        entry = daily[row['completed_on'].date()]
+        entry[0] += 1
+        entry[1] += row['score']
+    _add_deltas(DailyStats, 'day', daily)
+
+    pairs = [(row['user_id'], row['quiz_id']) for row in rows]
+    previous = {
+        (user_id, quiz_id): (score, completed_on, question_set_id, answers)
+        for user_id, quiz_id, score, completed_on, question_set_id, answers in db.session.query(
+            UserQuizProgress.user_id, UserQuizProgress.quiz_id,
+            UserQuizProgress.score, UserQuizProgress.completed_on,
+            UserQuizProgress.question_set_id, UserQuizProgress.answers
+        ).filter(tuple_(UserQuizProgress.user_id, UserQuizProgress.quiz_id).in_(pairs))
+    }
+    subject_of = dict(
+        db.session.query(Quiz.id, Chapter.subject_id)
+        .join(Chapter, Quiz.chapter_id == Chapter.id)
+        .filter(Quiz.id.in_({row['quiz_id'] for row in rows}))
+    )
+
+    users = defaultdict(lambda: [0, 0.0])
+    quizzes = defaultdict(lambda: [0, 0.0])
+    subjects = defaultdict(lambda: [0, 0.0])
+    boards = defaultdict(lambda: [0, 0.0])
+    added_items, removed_items = [], []
+    for row in rows:
+        old = previous.get((row['user_id'], row['quiz_id']))
+        if old is None:
+            attempts, score_delta = 1, row['score']
+        elif old[1] > row['completed_on']:
+            continue  # The upsert keeps the newer attempt, so nothing changes
+        else:
+            attempts, score_delta = 0, row['score'] - old[0]
+            removed_items.append((old[2], old[3], old[0]))
+        added_items.append((row.get('question_set_id'), row.get('answers'), row['score']))
+        user_id = row['user_id']
+        targets = [users[user_id], quizzes[row['quiz_id']],
+                   boards['global', 0, user_id], boards['quiz', row['quiz_id'], user_id]]
+        if row['quiz_id'] in subject_of:
+            targets.append(subjects[subject_of[row['quiz_id']]])
+            targets.append(boards['subject', subject_of[row['quiz_id']], user_id])
+        for entry in targets:
+            entry[0] += attempts
+            entry[1] += score_delta
+
+    _add_deltas(UserStats, 'user_id', users)
+    _add_deltas(QuizStats, 'quiz_id', quizzes)
+    _add_deltas(SubjectStats, 'subject_id', subjects)
+    leaderboards.add_deltas(boards)
+    item_analysis.record_attempts(added_items, removed_items)
+
+
+# Take the attempts of quizzes that are about to be deleted out of the rollups.
+# quiz_ids is a select of quiz ids; call before the UserQuizProgress rows are deleted.
+def forget_quizzes(quiz_ids):
+    _lock_writers()
+    per_user = select(
+        UserQuizProgress.user_id,
+        func.count().label('attempts'),
+        func.sum(UserQuizProgress.score).label('score_sum')
+    ).where(UserQuizProgress.quiz_id.in_(quiz_ids))\
+     .group_by(UserQuizProgress.user_id).subquery()
+    db.session.execute(
+        update(UserStats)
+        .where(UserStats.user_id == per_user.c.user_id)
+        .values(attempts=UserStats.attempts - per_user.c.attempts,
+                score_sum=UserStats.score_sum - per_user.c.score_sum),
+        execution_options={'synchronize_session': False}
+    )
+
+    per_subject = select(
+        Chapter.subject_id,
+        func.count().label('attempts'),
+        func.sum(UserQuizProgress.score).label('score_sum')
+    ).join(Quiz, Quiz.id == UserQuizProgress.quiz_id)\
+     .join(Chapter, Quiz.chapter_id == Chapter.id)\
+     .where(UserQuizProgress.quiz_id.in_(quiz_ids))\
+     .group_by(Chapter.subject_id).subquery()
+    db.session.execute(
+        update(SubjectStats)
+        .where(SubjectStats.subject_id == per_subject.c.subject_id)
+        .values(attempts=SubjectStats.attempts - per_subject.c.attempts,
+                score_sum=SubjectStats.score_sum - per_subject.c.score_sum),
+        execution_options={'synchronize_session': False}
+    )
+
+    # Leaderboards: take the scores out of the global and subject boards, drop the quiz boards
+    db.session.execute(
+        update(LeaderboardEntry)
+        .where(LeaderboardEntry.scope == 'global', LeaderboardEntry.scope_id == 0,
+               LeaderboardEntry.user_id == per_user.c.user_id)
+        .values(attempts=LeaderboardEntry.attempts - per_user.c.attempts,
+                points=LeaderboardEntry.points - per_user.c.score_sum),
+        execution_options={'synchronize_session': False}
+    )
+    per_subject_user = select(
+        Chapter.subject_id,
+        UserQuizProgress.user_id,
+        func.count().label('attempts'),
+        func.sum(UserQuizProgress.score).label('score_sum')
+    ).join(Quiz, Quiz.id == UserQuizProgress.quiz_id)\
+     .join(Chapter, Quiz.chapter_id == Chapter.id)\
+     .where(UserQuizProgress.quiz_id.in_(quiz_ids))\
+     .group_by(Chapter.subject_id, UserQuizProgress.user_id).subquery()
+    db.session.execute(
+        update(LeaderboardEntry)
+        .where(LeaderboardEntry.scope == 'subject', LeaderboardEntry.scope_id == per_subject_user.c.subject_id,
+               LeaderboardEntry.user_id == per_subject_user.c.user_id)
+        .values(attempts=LeaderboardEntry.attempts - per_subject_user.c.attempts,
+                points=LeaderboardEntry.points - per_subject_user.c.score_sum),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.execute(delete(LeaderboardEntry).where(LeaderboardEntry.scope == 'quiz',
+                                                      LeaderboardEntry.scope_id.in_(quiz_ids)),
+                       execution_options={'synchronize_session': False})
+    leaderboards.reset_after_commit()
+
+    db.session.execute(delete(QuizStats).where(QuizStats.quiz_id.in_(quiz_ids)),
+                       execution_options={'synchronize_session': False})
+    db.session.execute(delete(ItemStats).where(ItemStats.question_id.in_(
+                           select(Question.id).where(Question.quiz_id.in_(quiz_ids)))),
+                       execution_options={'synchronize_session': False})
+    for model in (UserStats, SubjectStats, LeaderboardEntry):
+        db.session.execute(delete(model).where(model.attempts <= 0),
+                           execution_options={'synchronize_session': False})
+
+
+# Recompute every rollup from UserQuizProgress. Daily activity can only be rebuilt from the
+# attempts still stored, one per user and quiz, so earlier retakes drop out of it.
+def rebuild():
+    _lock_writers()
+    for model in (UserStats, QuizStats, SubjectStats, DailyStats, LeaderboardEntry):
+        db.session.execute(delete(model))
+
+    attempts = func.count().label('attempts')
+    score_sum = func.sum(UserQuizProgress.score).label('score_sum')
+    day = func.date(UserQuizProgress.completed_on)
+    db.session.execute(insert(UserStats).from_select(
+        ['user_id', 'attempts', 'score_sum'],
+        select(UserQuizProgress.user_id, attempts, score_sum).group_by(UserQuizProgress.user_id)
+    ))
+    db.session.execute(insert(QuizStats).from_select(
+        ['quiz_id', 'attempts', 'score_sum'],
+        select(UserQuizProgress.quiz_id, attempts, score_sum).group_by(UserQuizProgress.quiz_id)
+    ))
+    db.session.execute(insert(SubjectStats).from_select(
+        ['subject_id', 'attempts', 'score_sum'],
+        select(Chapter.subject_id, attempts, score_sum)
+        .join(Quiz, Quiz.id == UserQuizProgress.quiz_id)
+        .join(Chapter, Quiz.chapter_id == Chapter.id)
+        .group_by(Chapter.subject_id)
+    ))
+    db.session.execute(insert(DailyStats).from_select(
+        ['day', 'attempts', 'score_sum'],
+        select(day, attempts, score_sum).group_by(day)
+    ))
+    _rebuild_leaderboards(attempts, score_sum)
+    item_analysis.rebuild()
+
+
+def _rebuild_leaderboards(attempts, score_sum):
+    columns = ['scope', 'scope_id', 'user_id', 'attempts', 'points']
+    db.session.execute(insert(LeaderboardEntry).from_select(columns, select(
+        literal('global'), literal(0), UserQuizProgress.user_id, attempts, score_sum
+    ).group_by(UserQuizProgress.user_id)))
+    db.session.execute(insert(LeaderboardEntry).from_select(columns, select(
+        literal('subject'), Chapter.subject_id, UserQuizProgress.user_id, attempts, score_sum
+    ).join(Quiz, Quiz.id == UserQuizProgress.quiz_id)
+     .join(Chapter, Quiz.chapter_id == Chapter.id)
+     .group_by(Chapter.subject_id, UserQuizProgress.user_id)))
+    db.session.execute(insert(LeaderboardEntry).from_select(columns, select(
+        literal('quiz'), UserQuizProgress.quiz_id, UserQuizProgress.user_id, literal(1), UserQuizProgress.score
+    )))
+    leaderboards.reset_after_commit()
+
+
+def _average(score_sum, attempts):
+    return score_sum / attempts if attempts else 0
+
+
+# Average score per user, one entry per user id (users sharing a full name stay separate)
+def user_averages():
+    rows = db.session.query(User.id, User.full_name, UserStats.score_sum, UserStats.attempts)\
+        .join(UserStats, UserStats.user_id == User.id)\
+        .filter(UserStats.attempts > 0)\
+        .order_by(User.id).all()
+    return [(user_id, full_name, _average(score_sum, attempts))
+            for user_id, full_name, score_sum, attempts in rows]
+
+
+def subject_averages():
+    rows = db.session.query(Subject.name, SubjectStats.score_sum, SubjectStats.attempts)\
+        .join(SubjectStats, SubjectStats.subject_id == Subject.id)\
+        .filter(SubjectStats.attempts > 0)\
+        .order_by(Subject.id).all()
+    return [(name, _average(score_sum, attempts), attempts) for name, score_sum, attempts in rows]
+
+
+def daily_activity(limit=90):
+    rows = db.session.query(DailyStats.day, DailyStats.score_sum, DailyStats.attempts)\
+        .order_by(DailyStats.day.desc()).limit(limit).all()
+    return [(day, _average(score_sum, attempts), attempts) for day, score_sum, attempts in reversed(rows)]
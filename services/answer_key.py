@@ -0,0 +1,137 @@
+from array import array
+from operator import eq
+from models import db
+from models.quiz import Question
+from models.question_set import QuestionSet, question_set_id, unpack_question_ids
+from services import catalog
+from services.cache import LRUCache
+
+VALID_OPTIONS = ('1', '2', '3', '4')
+
+
+# Compact answer key for one quiz: question ids and correct options in typed arrays.
+# Answers are graded as byte vectors aligned to question_ids, where 0 means unanswered.
+class AnswerKey:
+    def __init__(self, quiz_id, question_ids, correct_options, question_set_id=None):
+        self.quiz_id = quiz_id
+        self.question_set_id = question_set_id
+        self.question_ids = array('q', question_ids)
+        self.correct_options = array('B', correct_options)
+        self.positions = {question_id: i for i, question_id in enumerate(question_ids)}
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    # Answer vector from a submitted form with question_<id> fields
+    def answers_from_form(self, form):
+        answers = array('B', bytes(len(self)))
+        for i, question_id in enumerate(self.question_ids):
+            answer = form.get(f'question_{question_id}')
+            if answer in VALID_OPTIONS:
+                answers[i] = int(answer)
+        return answers
+
+    # Answer vector from a {question_id: option} mapping; unknown or non-numeric ids and
+    # invalid options are ignored
+    def answers_from_dict(self, user_answers):
+        answers = array('B', bytes(len(self)))
+        for question_id, answer in user_answers.items():
+            if not str(question_id).isdigit() or str(answer) not in VALID_OPTIONS:
+                continue
+            i = self.positions.get(int(question_id))
+            if i is not None:
+                answers[i] = int(answer)
+        return answers
+
+    # {question_id: option or None}, the legacy UserQuizProgress.user_answers format
+    def answers_to_dict(self, answers):
+        return {question_id: (answer or None) for question_id, answer in zip(self.question_ids, answers)}
+
+    # Number of correct answers; unanswered entries (0) never match a correct option
+    def grade(self, answers):
+        return sum(map(eq, answers, self.correct_options))
+
+    # Percentage score stored in UserQuizProgress.score
+    def score(self, answers):
+        return (self.grade(answers) / len(self)) * 100 if len(self) else 0
+
+    # Score many answer vectors for the same quiz in one call
+    def grade_many(self, answer_vectors):
+        return [self.score(answers) for answers in answer_vectors]
+
+
+# Answer key for a quiz, built from two columns without hydrating Question objects.
+# Cached against the catalog version, so add/edit/delete_question rebuild it.
+# With a question_set_id the key covers only the questions of that set, in its order, as drawn
+# by a randomized attempt; questions deleted since then can no longer be answered correctly.
+def get_answer_key(quiz_id, question_set_id=None):
+    full_key = _full_answer_key(quiz_id)
+    if question_set_id is None or question_set_id == full_key.question_set_id:
+        return full_key
+
+    def load_subset():
+        question_ids = get_question_set(question_set_id)
+        correct_options = [
+            full_key.correct_options[full_key.positions[question_id]] if question_id in full_key.positions else 0
+            for question_id in question_ids
+        ]
+        return AnswerKey(quiz_id, question_ids, correct_options, question_set_id)
+    return catalog.cached(('answer_key', quiz_id, question_set_id), load_subset)
+
+
+def _full_answer_key(quiz_id):
+    def load():
+        rows = db.session.query(Question.id, Question.correct_option)\
+            .filter(Question.quiz_id == quiz_id)\
+            .order_by(Question.id).all()
+        question_ids = [row[0] for row in rows]
+        # Registered in its own short transaction, outside the request's session
+        with db.engine.begin() as connection:
+            set_id = question_set_id(connection, quiz_id, question_ids)
+        return AnswerKey(quiz_id, question_ids, [row[1] for row in rows], set_id)
+    return catalog.cached(('answer_key', quiz_id), load)
+
+
+# Question sets never change once written, so they are cached without a version tag
+_question_sets = LRUCache(max_size=4096)
+
+
+# Ordered question ids of a question set
+def get_question_set(set_id):
+    question_ids = _question_sets.get(set_id)
+    if question_ids is None:
+        data = db.session.query(QuestionSet.question_ids).filter(QuestionSet.id == set_id).scalar()
+        question_ids = unpack_question_ids(data or b'')
+        _question_sets.set(set_id, question_ids)
+    return question_ids
+
+
+# {set_id: ordered question ids} for many sets, loading the uncached ones in chunked IN queries
+def get_question_sets(set_ids, chunk_size=500):
+    found, missing = {}, []
+    for set_id in set_ids:
+        question_ids = _question_sets.get(set_id)
+        if question_ids is None:
+            missing.append(set_id)
+        else:
+            found[set_id] = question_ids
+    for start in range(0, len(missing), chunk_size):
+        chunk = missing[start:start + chunk_size]
+        for set_id, data in db.session.query(QuestionSet.id, QuestionSet.question_ids).filter(QuestionSet.id.in_(chunk)):
+            found[set_id] = unpack_question_ids(data)
+            _question_sets.set(set_id, found[set_id])
+    return found
+
+
+# {question_id: option} for a stored attempt, answered questions only.
+# Reads the compact answers column and falls back to legacy JSON rows.
+def decode_answers(question_set_id, answers, user_answers=None):
+    if answers is not None:
+        return {question_id: answer for question_id, answer in zip(get_question_set(question_set_id), answers) if answer}
+    return {int(question_id): int(answer) for question_id, answer in (user_answers or {}).items() if answer}
+
+
+# Batch grading API: score many submissions of one quiz, each a {question_id: option} mapping
+def grade_submissions(quiz_id, submissions):
+    key = get_answer_key(quiz_id)
+    return key.grade_many(key.answers_from_dict(user_answers) for user_answers in submissions)
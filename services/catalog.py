@@ -0,0 +1,118 @@
+from flask import abort, current_app, g
+from sqlalchemy.orm import selectinload
+from models import db
+from models.subject import Subject
+from models.chapter import Chapter
+from models.quiz import Quiz, Question
+from models.catalog_version import CatalogVersion
+from services.cache import LRUCache
+
+# Read-through cache of the Subject/Chapter/Quiz/Question hierarchy.
+# Entries are tagged with the catalog version they were built from; an admin write
+# bumps the shared version, so every worker drops its stale entries on the next read.
+_cache = None
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        _cache = LRUCache(max_size=current_app.config.get('CATALOG_CACHE_SIZE', 512))
+    return _cache
+
+
+# Current catalog version, read once per request
+def current_version():
+    if 'catalog_version' not in g:
+        version = db.session.query(CatalogVersion.version).filter_by(id=1).scalar()
+        g.catalog_version = version or 0
+    return g.catalog_version
+
+
+# Called by every admin mutation before its commit, so the bump is part of the same transaction
+def bump_version():
+    updated = CatalogVersion.query.filter_by(id=1).update(
+        {CatalogVersion.version: CatalogVersion.version + 1}
+    )
+    if not updated:
+        db.session.add(CatalogVersion(id=1, version=1))
+    g.pop('catalog_version', None)
+
+
+# Return the cached value for key, rebuilding it with loader when the catalog has changed
+def cached(key, loader):
+    version = current_version()
+    cache = _get_cache()
+    entry = cache.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    value = loader()
+    cache.set(key, (version, value))
+    return value
+
+
+def _quiz_dict(quiz):
+    return {
+        'id': quiz.id,
+        'title': quiz.title,
+        'chapter_id': quiz.chapter_id,
+        'date': quiz.date,
+        'duration': quiz.duration,
+        'sample_size': quiz.sample_size,
+        'shuffle': quiz.shuffle,
+    }
+
+
+def _question_dict(question):
+    return {
+        'id': question.id,
+        'quiz_id': question.quiz_id,
+        'question_text': question.question_text,
+        'option_1': question.option_1,
+        'option_2': question.option_2,
+        'option_3': question.option_3,
+        'option_4': question.option_4,
+        'correct_option': question.correct_option,
+    }
+
+
+# Subject -> Chapter -> Quiz tree as plain dicts. Cached values are shared, do not mutate them.
+def get_tree():
+    def load():
+        subjects = Subject.query.options(
+            selectinload(Subject.chapters).selectinload(Chapter.quizzes)
+        ).order_by(Subject.id).all()
+        return [{
+            'id': subject.id,
+            'name': subject.name,
+            'description': subject.description,
+            'chapters': [{
+                'id': chapter.id,
+                'name': chapter.name,
+                'description': chapter.description,
+                'quizzes': [_quiz_dict(quiz) for quiz in chapter.quizzes],
+            } for chapter in subject.chapters],
+        } for subject in subjects]
+    return cached('tree', load)
+
+
+# Single quiz as a dict, or None if it does not exist
+def get_quiz(quiz_id):
+    def load():
+        quiz = db.session.get(Quiz, quiz_id)
+        return _quiz_dict(quiz) if quiz else None
+    return cached(('quiz', quiz_id), load)
+
+
+# Questions of a quiz in id order
+def get_questions(quiz_id):
+    def load():
+        questions = Question.query.filter_by(quiz_id=quiz_id).order_by(Question.id).all()
+        return [_question_dict(question) for question in questions]
+    return cached(('questions', quiz_id), load)
+
+
+def get_quiz_or_404(quiz_id):
+    quiz = get_quiz(quiz_id)
+    if quiz is None:
+        abort(404)
+    return quiz
@@ -0,0 +1,86 @@
+from itertools import groupby
+from sqlalchemy import func
+from models import db
+from models.subject import Subject
+from models.chapter import Chapter
+from models.quiz import Quiz, UserQuizProgress
+from services import catalog
+from services.cache import LRUCache
+from services.fragments import make_etag
+
+
+# Scores of every quiz this user has completed, {quiz_id: score}.
+# The catalog part of the dashboard is a cached fragment (services.fragments), so this keyed
+# query is the only per-user work the page needs.
+def load_progress(user_id):
+    return dict(
+        db.session.query(UserQuizProgress.quiz_id, UserQuizProgress.score)
+        .filter(UserQuizProgress.user_id == user_id)
+        .all()
+    )
+
+
+# Per-user summary cache. Entries are tagged with the catalog version, so renamed subjects and
+# quizzes show up, and with the user's own attempt count and latest completion time, read in one
+# indexed query, so an attempt committed by any worker replaces the cached chart.
+_summary_cache = LRUCache(max_size=10000)
+
+
+def _user_version(user_id):
+    return tuple(
+        db.session.query(func.count(UserQuizProgress.id), func.max(UserQuizProgress.completed_on))
+        .filter(UserQuizProgress.user_id == user_id)
+        .one()
+    )
+
+
+# Per-subject quiz scores for the dashboard chart, cached per user.
+# Returns (summary_data, etag); the ETag changes whenever the cached entry is rebuilt.
+def load_summary(user_id):
+    version = (catalog.current_version(), _user_version(user_id))
+    entry = _summary_cache.get(user_id)
+    if entry is not None and entry[0] == version:
+        return entry[1], entry[2]
+    summary_data = _query_summary(user_id)
+    etag = make_etag(user_id, version, summary_data)
+    _summary_cache.set(user_id, (version, summary_data, etag))
+    return summary_data, etag
+
+
+# Drop this worker's entry early; other workers notice the new attempt through _user_version
+def invalidate_summary(user_id):
+    _summary_cache.pop(user_id)
+
+
+# One query: every subject, outer-joined to the quizzes this user has attempted
+def _query_summary(user_id):
+    attempts = db.session.query(
+        Chapter.subject_id,
+        Quiz.id.label('quiz_id'),
+        Quiz.title,
+        UserQuizProgress.score
+    ).join(Quiz, Quiz.id == UserQuizProgress.quiz_id)\
+     .join(Chapter, Quiz.chapter_id == Chapter.id)\
+     .filter(UserQuizProgress.user_id == user_id)\
+     .subquery()
+
+    rows = db.session.query(
+        Subject.id,
+        Subject.name,
+        attempts.c.title,
+        attempts.c.score
+    ).outerjoin(attempts, attempts.c.subject_id == Subject.id)\
+     .order_by(Subject.id, attempts.c.quiz_id).all()
+
+    summary_data = []
+    for _, subject_rows in groupby(rows, key=lambda row: row[0]):
+        subject_rows = list(subject_rows)
+        quizzes = [
+            {'quiz_title': title, 'score': score}
+            for _, _, title, score in subject_rows if title is not None
+        ]
+        # Include subjects even if no quizzes exist
+        if not quizzes:
+            quizzes.append({'quiz_title': 'No Quizzes', 'score': 0})
+        summary_data.append({'subject_name': subject_rows[0][1], 'quizzes': quizzes})
+    return summary_data
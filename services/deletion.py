@@ -0,0 +1,46 @@
+from sqlalchemy import delete, select
+from models import db
+from models.subject import Subject
+from models.chapter import Chapter
+from models.quiz import Quiz, Question, UserQuizProgress
+from models.quiz_session import QuizSession
+from models.question_set import QuestionSet
+from models.analytics import SubjectStats
+from services import analytics
+
+# Set-based cascading deletes for the catalog.
+# Each delete is a handful of DELETE ... WHERE ... IN (subquery) statements, children first,
+# so removing a large subject never loads its rows and keeps the write transaction short.
+# The analytics rollups are adjusted in the same transaction.
+# The caller bumps the catalog version and commits.
+
+
+def _execute(stmt):
+    db.session.execute(stmt, execution_options={'synchronize_session': False})
+
+
+def _delete_quizzes(quiz_ids):
+    analytics.forget_quizzes(quiz_ids)
+    _execute(delete(UserQuizProgress).where(UserQuizProgress.quiz_id.in_(quiz_ids)))
+    _execute(delete(QuizSession).where(QuizSession.quiz_id.in_(quiz_ids)))
+    _execute(delete(QuestionSet).where(QuestionSet.quiz_id.in_(quiz_ids)))
+    _execute(delete(Question).where(Question.quiz_id.in_(quiz_ids)))
+    _execute(delete(Quiz).where(Quiz.id.in_(quiz_ids)))
+
+
+def delete_quiz(quiz_id):
+    _delete_quizzes(select(Quiz.id).where(Quiz.id == quiz_id))
+
+
+def delete_chapter(chapter_id):
+    _delete_quizzes(select(Quiz.id).where(Quiz.chapter_id == chapter_id))
+    _execute(delete(Chapter).where(Chapter.id == chapter_id))
+
+
+def delete_subject(subject_id):
+    _delete_quizzes(
+        select(Quiz.id).join(Chapter, Quiz.chapter_id == Chapter.id).where(Chapter.subject_id == subject_id)
+    )
+    _execute(delete(Chapter).where(Chapter.subject_id == subject_id))
+    _execute(delete(SubjectStats).where(SubjectStats.subject_id == subject_id))
+    _execute(delete(Subject).where(Subject.id == subject_id))
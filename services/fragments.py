@@ -0,0 +1,45 @@
+import hashlib
+from datetime import timezone
+from flask import make_response, render_template, request
+from markupsafe import Markup
+from services import catalog
+
+# Rendered-fragment cache and conditional HTTP responses.
+# Fragments only contain catalog content, so they are cached against the catalog version like
+# the catalog itself; per-user state is rendered around them or filled in by the page script.
+
+
+# Render a fragment template once per catalog version
+def render_fragment(key, template, **context):
+    return catalog.cached(('fragment',) + key, lambda: Markup(render_template(template, **context)))
+
+
+# Strong ETag over the values a response is built from
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:32]
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+# Answer with 304 when the client's copy is current, otherwise call render for the body.
+# last_modified is a naive local datetime, like the timestamps stored in the database.
+# Responses are per user: browsers revalidate them, shared caches must not store them.
+def conditional_response(etag, render, last_modified=None):
+    if last_modified is not None:
+        last_modified = last_modified.astimezone(timezone.utc).replace(microsecond=0)
+    if _not_modified(etag, last_modified):
+        response = make_response('', 304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
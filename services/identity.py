@@ -0,0 +1,55 @@
+import time
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event
+from models import db
+from models.user import User
+from services.cache import LRUCache
+
+# Identity cache for the Flask-Login user loader.
+# Authenticated requests only need id, full_name and role, so those are kept per process for
+# USER_CACHE_TTL seconds instead of selecting the User row on every page view. Entries are
+# dropped on logout and whenever a User row is updated or deleted through the ORM; the TTL
+# bounds how long other worker processes can serve a stale copy.
+
+_cache = None
+
+
+class CachedUser(UserMixin):
+    def __init__(self, id, full_name, role):
+        self.id = id
+        self.full_name = full_name
+        self.role = role
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        _cache = LRUCache(current_app.config.get('USER_CACHE_SIZE', 4096))
+    return _cache
+
+
+def load_user(user_id):
+    user_id = int(user_id)
+    cache = _get_cache()
+    entry = cache.get(user_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    row = db.session.query(User.id, User.full_name, User.role).filter(User.id == user_id).first()
+    if row is None:
+        cache.pop(user_id)
+        return None
+    user = CachedUser(*row)
+    cache.set(user_id, (time.monotonic() + current_app.config.get('USER_CACHE_TTL', 300), user))
+    return user
+
+
+def invalidate(user_id):
+    if _cache is not None:
+        _cache.pop(int(user_id))
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    invalidate(target.id)
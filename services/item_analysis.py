@@ -0,0 +1,191 @@
+import math
+from collections import defaultdict
+import numpy as np
+from sqlalchemy import delete
+from models import db
+from models.quiz import Question, UserQuizProgress
+from models.analytics import ItemStats
+from models.dialect import upsert_insert
+from services import catalog
+from services.answer_key import get_question_set, get_question_sets
+
+# Item analysis: difficulty (p-value), point-biserial discrimination and option choice
+# distributions per question.
+# ItemStats holds per-question sums over the current attempts. They are updated with vectorised
+# deltas as attempt batches are committed, so reading a quiz's analysis costs a single query
+# however many attempts it has.
+
+OPTIONS = 5  # 0 = unanswered, then option_1 .. option_4
+STAT_COLUMNS = (
+    ['attempts', 'score_sum', 'score_sq_sum']
+    + [f'chosen_{option}' for option in range(OPTIONS)]
+    + [f'score_sum_{option}' for option in range(OPTIONS)]
+)
+
+# Thresholds for the review flags; items with fewer attempts are not flagged
+MIN_ATTEMPTS = 20
+TOO_EASY = 0.9
+TOO_HARD = 0.2
+LOW_DISCRIMINATION = 0.2
+WEAK_DISTRACTOR = 0.05
+
+
+# Stat deltas for every question of one question set, shape (questions, len(STAT_COLUMNS)).
+# blobs are packed answer vectors of equal length; weights are +1 to add an attempt, -1 to remove it.
+def _set_deltas(question_count, blobs, scores, weights):
+    answers = np.frombuffer(b''.join(blobs), dtype=np.uint8).reshape(len(blobs), question_count)
+    scores = np.asarray(scores, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    weighted_scores = weights * scores
+    choices = (answers[:, :, None] == np.arange(OPTIONS)).astype(np.float64)  # attempts x questions x options
+    totals = np.array([weights.sum(), weighted_scores.sum(), (weighted_scores * scores).sum()])
+    return np.hstack([
+        np.broadcast_to(totals, (question_count, 3)),
+        np.einsum('i,ijo->jo', weights, choices),
+        np.einsum('i,ijo->jo', weighted_scores, choices),
+    ])
+
+
+# Sum the deltas of many attempts per question id.
+# attempts yields (question_set_id, answers, score, weight); legacy rows without packed answers are skipped.
+def _deltas(attempts, chunk_size=10000):
+    groups = defaultdict(lambda: ([], [], []))
+    deltas = {}
+
+    def flush(set_id, group, question_ids=None):
+        blobs, scores, weights = group
+        if question_ids is None:
+            question_ids = get_question_set(set_id)
+        if blobs and len(question_ids):
+            for question_id, row in zip(question_ids, _set_deltas(len(question_ids), blobs, scores, weights)):
+                if question_id in deltas:
+                    deltas[question_id] += row
+                else:
+                    deltas[question_id] = row.copy()
+        for values in group:
+            values.clear()
+
+    for set_id, answers, score, weight in attempts:
+        if set_id is None or answers is None:
+            continue
+        group = groups[set_id]
+        group[0].append(answers)
+        group[1].append(score)
+        group[2].append(weight)
+        if len(group[0]) >= chunk_size:
+            flush(set_id, group)
+    # One query for every set still to flush rather than one per set
+    question_sets = get_question_sets([set_id for set_id, group in groups.items() if group[0]])
+    for set_id, group in groups.items():
+        flush(set_id, group, question_sets.get(set_id, ()))
+    return deltas
+
+
+def _apply(deltas, batch_size=1000):
+    # Questions deleted since their question set was written have no stats to update
+    existing = {question_id for (question_id,) in db.session.query(Question.id).filter(Question.id.in_(list(deltas)))}
+    rows = [
+        dict(zip(STAT_COLUMNS, row.tolist()), question_id=question_id)
+        for question_id, row in deltas.items() if question_id in existing
+    ]
+    for start in range(0, len(rows), batch_size):
+        stmt = upsert_insert(ItemStats).values(rows[start:start + batch_size])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['question_id'],
+            set_={column: getattr(ItemStats, column) + getattr(stmt.excluded, column) for column in STAT_COLUMNS},
+        )
+        db.session.execute(stmt)
+
+
+# Fold committed attempts into ItemStats: added and removed are (question_set_id, answers, score)
+# tuples, removed being the attempts a retake replaces. Runs in the submission flush transaction.
+def record_attempts(added, removed=()):
+    attempts = [(set_id, answers, score, 1) for set_id, answers, score in added]
+    attempts += [(set_id, answers, score, -1) for set_id, answers, score in removed]
+    deltas = _deltas(attempts)
+    if deltas:
+        _apply(deltas)
+
+
+# Recompute ItemStats from every attempt, streaming the answers matrix in chunks
+def rebuild():
+    db.session.execute(delete(ItemStats))
+    rows = db.session.query(UserQuizProgress.question_set_id, UserQuizProgress.answers, UserQuizProgress.score)\
+        .filter(UserQuizProgress.answers.isnot(None))\
+        .order_by(UserQuizProgress.question_set_id)\
+        .execution_options(yield_per=10000)
+    deltas = _deltas((set_id, answers, score, 1) for set_id, answers, score in rows)
+    if deltas:
+        _apply(deltas)
+
+
+def _number(value):
+    value = float(value)
+    return None if math.isnan(value) or math.isinf(value) else round(value, 4)
+
+
+# Per-question analysis of a quiz, in question order, computed over all its items at once
+def analyse_quiz(quiz_id):
+    questions = catalog.get_questions(quiz_id)
+    if not questions:
+        return []
+    stats = {
+        row.question_id: [getattr(row, column) for column in STAT_COLUMNS]
+        for row in ItemStats.query.filter(ItemStats.question_id.in_([q['id'] for q in questions]))
+    }
+    matrix = np.array([stats.get(q['id'], [0] * len(STAT_COLUMNS)) for q in questions], dtype=np.float64)
+    # Questions stored with a correct option outside 1..4 get no p-value or discrimination
+    correct = np.array([q['correct_option'] if q['correct_option'] in range(1, OPTIONS) else 0 for q in questions])
+    valid = correct > 0
+    rows = np.arange(len(questions))
+
+    attempts, score_sum, score_sq_sum = matrix[:, 0], matrix[:, 1], matrix[:, 2]
+    chosen, chosen_scores = matrix[:, 3:3 + OPTIONS], matrix[:, 3 + OPTIONS:]
+    correct_count = np.where(valid, chosen[rows, correct], np.nan)
+    correct_scores = np.where(valid, chosen_scores[rows, correct], np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_value = correct_count / attempts
+        mean = score_sum / attempts
+        sd = np.sqrt(np.maximum(score_sq_sum / attempts - mean ** 2, 0))
+        mean_correct = correct_scores / correct_count
+        mean_incorrect = (score_sum - correct_scores) / (attempts - correct_count)
+        # Point-biserial correlation between answering correctly and the attempt score
+        discrimination = (mean_correct - mean_incorrect) / sd * np.sqrt(p_value * (1 - p_value))
+        share = chosen / attempts[:, None]
+        option_mean = chosen_scores / chosen
+
+    analysis = []
+    for i, question in enumerate(questions):
+        options = [{
+            'option': option,
+            'text': question[f'option_{option}'],
+            'correct': option == question['correct_option'],
+            'chosen': int(chosen[i, option]),
+            'share': _number(share[i, option]),
+            'mean_score': _number(option_mean[i, option]),
+        } for option in range(1, OPTIONS)]
+
+        flags = []
+        if not valid[i]:
+            flags.append('invalid_correct_option')
+        elif attempts[i] >= MIN_ATTEMPTS:
+            if p_value[i] > TOO_EASY:
+                flags.append('too_easy')
+            if p_value[i] < TOO_HARD:
+                flags.append('too_hard')
+            if not discrimination[i] >= LOW_DISCRIMINATION:
+                flags.append('low_discrimination')
+            if any(not option['correct'] and (option['share'] or 0) < WEAK_DISTRACTOR for option in options):
+                flags.append('weak_distractor')
+
+        analysis.append({
+            'question_id': question['id'],
+            'question_text': question['question_text'],
+            'attempts': int(attempts[i]),
+            'p_value': _number(p_value[i]),
+            'discrimination': _number(discrimination[i]),
+            'unanswered_share': _number(share[i, 0]),
+            'options': options,
+            'flags': flags,
+        })
+    return analysis
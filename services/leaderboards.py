@@ -0,0 +1,179 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db
+from models.user import User
+from models.analytics import LeaderboardEntry
+from models.dialect import upsert_insert
+from services.cache import LRUCache
+
+# Per-quiz, per-subject and global leaderboards.
+# LeaderboardEntry rows are updated with point deltas in the submission flush transaction, like
+# the other rollups. Each board a process serves is also held in memory as a sorted array of
+# (-points, user_id) keys, so top-K is a slice and a user's rank is one binary search. Once the
+# flush commits, its deltas are applied to the boards this process has loaded; boards are
+# reloaded from the table after LEADERBOARD_TTL seconds so other workers' submissions show up.
+
+SCOPES = ('global', 'subject', 'quiz')
+MAX_LIMIT = 100
+
+
+class RankedBoard:
+    def __init__(self, rows):
+        self._entries = {user_id: (points, attempts) for user_id, points, attempts in rows}
+        self._keys = sorted((-points, user_id) for user_id, (points, _) in self._entries.items())
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, user_id, points, attempts):
+        with self._lock:
+            old_points, old_attempts = self._entries.pop(user_id, (0, 0))
+            if old_attempts:
+                del self._keys[bisect_left(self._keys, (-old_points, user_id))]
+            points, attempts = old_points + points, old_attempts + attempts
+            if attempts > 0:
+                self._entries[user_id] = (points, attempts)
+                insort(self._keys, (-points, user_id))
+
+    # Users sharing a score share a rank: 1 + the number of users with more points
+    def _rank(self, points):
+        return bisect_left(self._keys, (-points,)) + 1
+
+    def rank(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            return {'rank': self._rank(entry[0]), 'points': entry[0], 'attempts': entry[1], 'total': len(self._keys)}
+
+    def top(self, limit, offset=0):
+        with self._lock:
+            return [
+                {'rank': self._rank(-negative_points), 'user_id': user_id,
+                 'points': -negative_points, 'attempts': self._entries[user_id][1]}
+                for negative_points, user_id in self._keys[offset:offset + limit]
+            ]
+
+
+_boards = None
+_sync_lock = threading.Lock()
+_commits_in_flight = 0
+_commit_count = 0
+
+
+def _get_boards():
+    global _boards
+    if _boards is None:
+        _boards = LRUCache(max_size=current_app.config.get('LEADERBOARD_CACHE_SIZE', 256))
+    return _boards
+
+
+def get_board(scope, scope_id=0):
+    boards = _get_boards()
+    key = (scope, scope_id)
+    entry = boards.get(key)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    with _sync_lock:
+        in_flight, commits = _commits_in_flight, _commit_count
+    rows = db.session.query(LeaderboardEntry.user_id, LeaderboardEntry.points, LeaderboardEntry.attempts)\
+        .filter(LeaderboardEntry.scope == scope, LeaderboardEntry.scope_id == scope_id,
+                LeaderboardEntry.attempts > 0)\
+        .order_by(LeaderboardEntry.points.desc()).all()
+    board = RankedBoard(rows)
+    # A board read while a flush commits may already hold deltas that are about to be applied
+    # to the cached boards; serve it once without caching it
+    with _sync_lock:
+        if not in_flight and commits == _commit_count:
+            boards.set(key, (time.monotonic() + current_app.config.get('LEADERBOARD_TTL', 30), board))
+    return board
+
+
+def _with_names(rows):
+    names = dict(db.session.query(User.id, User.full_name).filter(User.id.in_([row['user_id'] for row in rows])))
+    for row in rows:
+        row['full_name'] = names.get(row['user_id'], 'Unknown')
+    return rows
+
+
+# One page of a board in rank order, with display names, and the board size
+def top(scope, scope_id=0, limit=10, offset=0):
+    board = get_board(scope, scope_id)
+    return {'entries': _with_names(board.top(max(1, min(limit, MAX_LIMIT)), max(0, offset))), 'total': len(board)}
+
+
+# {'rank', 'points', 'attempts', 'total'} for a user, or None if they are not on the board
+def rank_of(scope, scope_id, user_id):
+    return get_board(scope, scope_id).rank(user_id)
+
+
+# Add point deltas in the current transaction: {(scope, scope_id, user_id): [attempts, points]}.
+# The cached boards follow once the transaction commits.
+def add_deltas(deltas):
+    if not deltas:
+        return
+    stmt = upsert_insert(LeaderboardEntry).values([
+        {'scope': scope, 'scope_id': scope_id, 'user_id': user_id, 'attempts': attempts, 'points': points}
+        for (scope, scope_id, user_id), (attempts, points) in deltas.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['scope', 'scope_id', 'user_id'],
+        set_={
+            'attempts': LeaderboardEntry.attempts + stmt.excluded.attempts,
+            'points': LeaderboardEntry.points + stmt.excluded.points,
+        },
+    )
+    db.session.execute(stmt)
+    pending = db.session.info.setdefault('leaderboard_deltas', defaultdict(lambda: [0, 0.0]))
+    for key, (attempts, points) in deltas.items():
+        pending[key][0] += attempts
+        pending[key][1] += points
+
+
+# Drop every cached board once the current transaction commits (deletes and rebuilds)
+def reset_after_commit():
+    db.session.info['leaderboard_reset'] = True
+
+
+@event.listens_for(Session, 'before_commit')
+def _before_commit(session):
+    global _commits_in_flight
+    if session.info.get('leaderboard_deltas') or session.info.get('leaderboard_reset'):
+        session.info['leaderboard_in_flight'] = True
+        with _sync_lock:
+            _commits_in_flight += 1
+
+
+def _finish(session, committed):
+    global _commits_in_flight, _commit_count
+    deltas = session.info.pop('leaderboard_deltas', None)
+    reset = session.info.pop('leaderboard_reset', False)
+    in_flight = session.info.pop('leaderboard_in_flight', False)
+    if committed and _boards is not None:
+        if reset:
+            _boards.clear()
+        elif deltas:
+            for (scope, scope_id, user_id), (attempts, points) in deltas.items():
+                entry = _boards.get((scope, scope_id))
+                if entry is not None:
+                    entry[1].add(user_id, points, attempts)
+    if in_flight:
+        with _sync_lock:
+            _commits_in_flight -= 1
+            _commit_count += 1
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    _finish(session, True)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    _finish(session, False)
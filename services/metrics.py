@@ -0,0 +1,270 @@
+import cProfile
+import logging
+import os
+import random
+import threading
+import time
+from flask import Response, g, has_app_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Request instrumentation exposed in the Prometheus text format on /metrics.
+# Every route gets a latency histogram, a request counter and per-request SQL query counts and
+# time (from SQLAlchemy cursor events); templates get a render-time histogram. Metrics are kept
+# per process, so scrape each worker or aggregate them in Prometheus.
+# With PROFILE_SLOW_REQUESTS a sample of requests runs under cProfile and the profiles of
+# those slower than SLOW_REQUEST_SECONDS are written to instance/profiles.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values=(), amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _label_text(self.labels, key), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, entry):
+                    samples.append((f'{self.name}_bucket', _label_text(self.labels, key, [('le', bound)]), count))
+                samples.append((f'{self.name}_bucket', _label_text(self.labels, key, [('le', '+Inf')]), entry[-1]))
+                samples.append((f'{self.name}_sum', _label_text(self.labels, key), entry[-2]))
+                samples.append((f'{self.name}_count', _label_text(self.labels, key), entry[-1]))
+        return samples
+
+
+# Value read at scrape time; read() returns None to omit it
+class Gauge:
+    def __init__(self, name, help, read, kind='gauge'):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.kind = kind
+
+    def samples(self):
+        value = self.read()
+        return [] if value is None else [(self.name, '', value)]
+
+
+REQUESTS = Counter('quiz_http_requests_total', 'HTTP requests by route and status.', ('endpoint', 'method', 'status'))
+LATENCY = Histogram('quiz_http_request_duration_seconds', 'Request latency by route.', ('endpoint', 'method'))
+QUERIES = Histogram('quiz_db_queries_per_request', 'SQL statements executed per request.', ('endpoint',),
+                    buckets=QUERY_BUCKETS)
+QUERY_TIME = Counter('quiz_db_query_seconds_total', 'Time spent in SQL statements by route.', ('endpoint',))
+BACKGROUND_QUERIES = Counter('quiz_db_background_queries_total', 'SQL statements run outside requests.')
+TEMPLATES = Histogram('quiz_template_render_seconds', 'Template render time.', ('template',))
+SLOW_PROFILES = Counter('quiz_slow_request_profiles_total', 'Slow requests captured with cProfile.', ('endpoint',))
+
+_registry = [REQUESTS, LATENCY, QUERIES, QUERY_TIME, BACKGROUND_QUERIES, TEMPLATES, SLOW_PROFILES]
+
+
+def _submission_queue_depth():
+    from services import submission_queue
+    return submission_queue._queue.depth() if submission_queue._queue is not None else None
+
+
+def _autosave_sessions():
+    from services import quiz_sessions
+    return quiz_sessions._store.depth() if quiz_sessions._store is not None else None
+
+
+_registry += [
+    Gauge('quiz_submission_queue_depth', 'Attempts waiting for the batch commit.', _submission_queue_depth),
+    Gauge('quiz_autosave_sessions', 'Quiz sessions held in the autosave store.', _autosave_sessions),
+]
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        samples = metric.samples()
+        if not samples:
+            continue
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(f'{name}{labels} {_number(value)}' for name, labels, value in samples)
+    return '\n'.join(lines) + '\n'
+
+
+# SQL statements are attributed to the current request, or counted as background work
+# (submission queue, autosave flushes) when there is none
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    elapsed = time.perf_counter() - started.pop() if started else 0.0
+    if has_app_context() and 'metrics_queries' in g:
+        g.metrics_queries[0] += 1
+        g.metrics_queries[1] += elapsed
+    else:
+        BACKGROUND_QUERIES.inc()
+
+
+def _before_render(sender, template, context, **extra):
+    if has_app_context():
+        g.setdefault('metrics_templates', []).append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    starts = g.get('metrics_templates') if has_app_context() else None
+    if starts:
+        TEMPLATES.observe((template.name or 'string',), time.perf_counter() - starts.pop())
+
+
+_profile_lock = threading.Lock()  # One cProfile at a time per process
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_queries = [0, 0.0]
+    config = g.metrics_config
+    if config['profile'] and random.random() < config['sample_rate'] and _profile_lock.acquire(blocking=False):
+        g.metrics_profile = cProfile.Profile()
+        g.metrics_profile.enable()
+
+
+def _finish_request(status):
+    if g.get('metrics_done'):
+        return
+    g.metrics_done = True
+    elapsed = time.perf_counter() - g.metrics_started
+    endpoint = request.endpoint or 'unmatched'
+    REQUESTS.inc((endpoint, request.method, status))
+    LATENCY.observe((endpoint, request.method), elapsed)
+    count, query_seconds = g.metrics_queries
+    QUERIES.observe((endpoint,), count)
+    QUERY_TIME.inc((endpoint,), query_seconds)
+
+    config = g.metrics_config
+    if count >= config['query_warning']:
+        logger.warning('%s %s ran %d SQL statements (%.1f ms); possible N+1 query', request.method,
+                       request.path, count, query_seconds * 1000)
+
+    profile = g.pop('metrics_profile', None)
+    if profile is not None:
+        profile.disable()
+        _profile_lock.release()
+        if elapsed >= config['slow_seconds']:
+            _save_profile(profile, endpoint, elapsed, config['profile_dir'])
+
+
+def _save_profile(profile, endpoint, elapsed, profile_dir):
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(profile_dir, f'{time.strftime("%Y%m%d-%H%M%S")}-{endpoint}-{int(elapsed * 1000)}ms.prof')
+    profile.dump_stats(path)
+    SLOW_PROFILES.inc((endpoint,))
+    logger.info('Slow request %s took %.0f ms; profile written to %s', endpoint, elapsed * 1000, path)
+
+
+_engine_hooks_installed = False
+
+
+# Install the request, template and SQL hooks and the /metrics endpoint
+def init_metrics(app):
+    global _engine_hooks_installed
+    config = {
+        'profile': app.config.get('PROFILE_SLOW_REQUESTS', False),
+        'sample_rate': app.config.get('PROFILE_SAMPLE_RATE', 0.05),
+        'slow_seconds': app.config.get('SLOW_REQUEST_SECONDS', 1.0),
+        'profile_dir': os.path.join(app.instance_path, 'profiles'),
+        'query_warning': app.config.get('QUERY_COUNT_WARNING', 50),
+    }
+    skip = {'static', 'metrics'}
+
+    @app.before_request
+    def before_request():
+        if request.endpoint not in skip:
+            g.metrics_config = config
+            _start_request()
+
+    @app.after_request
+    def after_request(response):
+        if 'metrics_config' in g:
+            _finish_request(response.status_code)
+        return response
+
+    @app.teardown_request
+    def teardown_request(exception):
+        # Requests that raised never reach after_request
+        if 'metrics_config' in g and exception is not None:
+            _finish_request(500)
+
+    if not _engine_hooks_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        before_render_template.connect(_before_render)
+        template_rendered.connect(_after_render)
+        _engine_hooks_installed = True
+
+    allowed = set(app.config.get('METRICS_ALLOWED_HOSTS', ('127.0.0.1', '::1')))
+
+    def metrics():
+        from flask import session
+        if request.remote_addr not in allowed and not session.get('admin_logged_in'):
+            return Response('Forbidden\n', status=403, mimetype='text/plain')
+        return Response(render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+from services import metrics
+
+# Password hashing off the request thread.
+# pbkdf2 work runs in a small process pool so a login burst cannot starve the worker's other
+# requests. At most PASSWORD_HASH_QUEUE_LIMIT hashes may be queued or running per process;
+# beyond that callers get HashQueueFull instead of piling up, and a hash that takes longer than
+# PASSWORD_HASH_TIMEOUT raises HashTimeout. Queue depth, latency and rejections are reported
+# on /metrics.
+
+class HashQueueFull(Exception):
+    pass
+
+
+class HashTimeout(Exception):
+    pass
+
+
+_pool = None
+_pool_pid = None
+_lock = threading.Lock()
+_slots = None
+_depth = 0
+
+HASH_SECONDS = metrics.register(metrics.Histogram(
+    'quiz_password_hash_seconds', 'Password hash and check time including queueing.', ('operation',),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+))
+HASH_REJECTED = metrics.register(metrics.Counter(
+    'quiz_password_hash_rejected_total', 'Hashes refused because the queue was full.'
+))
+metrics.register(metrics.Gauge(
+    'quiz_password_hash_queue_depth', 'Hashes queued or running in the pool.', lambda: _depth
+))
+
+
+def _get_pool():
+    global _pool, _pool_pid, _slots
+    with _lock:
+        # A forked worker must not reuse its parent's pool
+        if _pool is None or _pool_pid != os.getpid():
+            config = current_app.config
+            _pool = ProcessPoolExecutor(max_workers=config.get('PASSWORD_HASH_WORKERS', 2))
+            _pool_pid = os.getpid()
+            _slots = threading.BoundedSemaphore(config.get('PASSWORD_HASH_QUEUE_LIMIT', 64))
+        return _pool
+
+
+def _run(operation, func, *args):
+    global _depth
+    if not current_app.config.get('PASSWORD_HASH_WORKERS', 2):
+        return func(*args)  # Pool disabled: hash inline
+
+    pool = _get_pool()
+    if not _slots.acquire(blocking=False):
+        HASH_REJECTED.inc()
+        raise HashQueueFull()
+    start = time.perf_counter()
+    with _lock:
+        _depth += 1
+    try:
+        future = pool.submit(func, *args)
+        try:
+            return future.result(timeout=current_app.config.get('PASSWORD_HASH_TIMEOUT', 30))
+        except FutureTimeout:
+            future.cancel()
+            raise HashTimeout()
+    finally:
+        with _lock:
+            _depth -= 1
+        _slots.release()
+        HASH_SECONDS.observe((operation,), time.perf_counter() - start)
+
+
+# Hash with the configured method and cost, e.g. 'pbkdf2:sha256:600000'
+def hash_password(password):
+    return _run('hash', generate_password_hash, password, current_app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256'))
+
+
+def check_password(password_hash, password):
+    return _run('check', check_password_hash, password_hash, password)
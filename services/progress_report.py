@@ -0,0 +1,112 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from models import db
+from models.user import User
+from models.subject import Subject
+from models.chapter import Chapter
+from models.quiz import Quiz, UserQuizProgress
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+COLUMNS = ('user', 'subject', 'quiz', 'score', 'completed_on')
+
+
+# Subject, quiz and date-range filters from request arguments; raises ValueError on bad input
+def parse_filters(args):
+    filters = {}
+    for name in ('subject_id', 'quiz_id'):
+        if args.get(name):
+            filters[name] = int(args[name])
+    for name in ('date_from', 'date_to'):
+        if args.get(name):
+            filters[name] = datetime.strptime(args[name], '%Y-%m-%d')
+    return filters
+
+
+def _query(filters):
+    query = db.session.query(
+        User.full_name,
+        Subject.name.label('subject_name'),
+        Quiz.title,
+        UserQuizProgress.score,
+        UserQuizProgress.completed_on,
+        UserQuizProgress.id
+    ).join(UserQuizProgress, User.id == UserQuizProgress.user_id)\
+     .join(Quiz, Quiz.id == UserQuizProgress.quiz_id)\
+     .join(Chapter, Quiz.chapter_id == Chapter.id)\
+     .join(Subject, Chapter.subject_id == Subject.id)
+    if 'subject_id' in filters:
+        query = query.filter(Chapter.subject_id == filters['subject_id'])
+    if 'quiz_id' in filters:
+        query = query.filter(UserQuizProgress.quiz_id == filters['quiz_id'])
+    if 'date_from' in filters:
+        query = query.filter(UserQuizProgress.completed_on >= filters['date_from'])
+    if 'date_to' in filters:
+        # date_to is inclusive
+        query = query.filter(UserQuizProgress.completed_on < filters['date_to'] + timedelta(days=1))
+    # Newest first; the index on (completed_on, id) serves both the order and the keyset
+    return query.order_by(UserQuizProgress.completed_on.desc(), UserQuizProgress.id.desc())
+
+
+def _encode_cursor(row):
+    return f'{row.completed_on.isoformat()}_{row.id}'
+
+
+def _decode_cursor(cursor):
+    completed_on, _, progress_id = cursor.rpartition('_')
+    return datetime.fromisoformat(completed_on), int(progress_id)
+
+
+# One page of attempts after the given cursor. Returns (rows, next_cursor or None).
+# Raises ValueError for a malformed cursor.
+def progress_page(filters, cursor=None, limit=PAGE_SIZE):
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = _query(filters)
+    if cursor:
+        completed_on, progress_id = _decode_cursor(cursor)
+        query = query.filter(or_(
+            UserQuizProgress.completed_on < completed_on,
+            and_(UserQuizProgress.completed_on == completed_on, UserQuizProgress.id < progress_id)
+        ))
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], _encode_cursor(rows[limit - 1])
+    return rows, None
+
+
+def row_dict(row):
+    return {
+        'user': row.full_name,
+        'subject': row.subject_name,
+        'quiz': row.title,
+        'score': row.score,
+        'completed_on': row.completed_on.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def _iter_rows(filters):
+    return _query(filters).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+
+# Stream every matching attempt as NDJSON; memory stays constant however many rows match
+def export_ndjson(filters):
+    for row in _iter_rows(filters):
+        yield json.dumps(row_dict(row)) + '\n'
+
+
+# Stream every matching attempt as CSV in chunks
+def export_csv(filters):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+    writer.writeheader()
+    for row in _iter_rows(filters):
+        writer.writerow(row_dict(row))
+        if buffer.tell() > 65536:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,139 @@
+import csv
+import io
+import json
+from sqlalchemy import insert
+from models import db
+from models.quiz import Question
+from services import catalog
+
+FIELDS = ('question_text', 'option_1', 'option_2', 'option_3', 'option_4', 'correct_option')
+MAX_OPTION_LENGTH = 120
+MAX_REPORTED_ERRORS = 20
+
+
+class QuestionImportError(ValueError):
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} invalid row(s) in question bank')
+        self.errors = errors
+
+
+# Stream rows out of a CSV question bank with a header row
+def iter_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+# Stream objects out of a JSON array or a JSON Lines file without loading it whole
+def iter_json(stream, chunk_size=65536):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    while True:
+        # Skip whitespace, the array brackets and the separators between objects
+        buffer = buffer.lstrip(' \t\r\n,[]')
+        if not eof and len(buffer) < chunk_size:
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        if not buffer:
+            return
+        try:
+            row, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Object spans the chunk boundary; read more before decoding
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield row
+
+
+def iter_rows(stream, filename):
+    if filename.lower().endswith('.csv'):
+        return iter_csv(stream)
+    return iter_json(stream)
+
+
+# Validate one row and return the column values for an insert
+def validate_row(row, quiz_id):
+    if not isinstance(row, dict):
+        raise ValueError('row is not an object')
+    values = {'quiz_id': quiz_id}
+    for field in FIELDS[:-1]:
+        value = str(row.get(field) or '').strip()
+        if not value:
+            raise ValueError(f'{field} is required')
+        if field != 'question_text' and len(value) > MAX_OPTION_LENGTH:
+            raise ValueError(f'{field} is longer than {MAX_OPTION_LENGTH} characters')
+        values[field] = value
+    try:
+        values['correct_option'] = int(row.get('correct_option'))
+    except (TypeError, ValueError):
+        raise ValueError('correct_option must be a number from 1 to 4')
+    if values['correct_option'] not in (1, 2, 3, 4):
+        raise ValueError('correct_option must be a number from 1 to 4')
+    return values
+
+
+# Insert every row into the quiz in chunked executemany batches inside one transaction.
+# Nothing is committed if any row is invalid. Returns the number of questions imported.
+def import_questions(quiz_id, rows, chunk_size=500):
+    errors = []
+    chunk = []
+    count = 0
+    try:
+        for line, row in enumerate(rows, start=1):
+            try:
+                chunk.append(validate_row(row, quiz_id))
+            except ValueError as e:
+                errors.append(f'Row {line}: {e}')
+                if len(errors) >= MAX_REPORTED_ERRORS:
+                    break
+                continue
+            if len(chunk) >= chunk_size and not errors:
+                db.session.execute(insert(Question), chunk)
+                count += len(chunk)
+                chunk = []
+        if errors:
+            raise QuestionImportError(errors)
+        if chunk:
+            db.session.execute(insert(Question), chunk)
+            count += len(chunk)
+        catalog.bump_version()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return count
+
+
+def _question_rows(quiz_id, batch_size=1000):
+    query = db.session.query(*(getattr(Question, field) for field in FIELDS))\
+        .filter(Question.quiz_id == quiz_id)\
+        .order_by(Question.id)\
+        .execution_options(yield_per=batch_size)
+    for row in query:
+        yield dict(zip(FIELDS, row))
+
+
+# Stream the questions of a quiz as CSV, in the format import_questions accepts
+def export_csv(quiz_id):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+    writer.writeheader()
+    for row in _question_rows(quiz_id):
+        writer.writerow(row)
+        if buffer.tell() > 65536:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+# Stream the questions of a quiz as JSON Lines, one question object per line
+def export_json(quiz_id):
+    for row in _question_rows(quiz_id):
+        yield json.dumps(row) + '\n'
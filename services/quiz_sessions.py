@@ -0,0 +1,250 @@
+import atexit
+import logging
+import secrets
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import bindparam, or_, update
+from models import db
+from models.quiz_session import QuizSession
+from models.question_set import question_set_id
+from services import randomizer
+
+logger = logging.getLogger(__name__)
+
+# Server-authoritative timed quiz sessions.
+# start_session() records a start token and a deadline in the database. Heartbeats keep the
+# latest in-progress answers in an in-memory store, which a background thread writes back in
+# one executemany UPDATE every QUIZ_AUTOSAVE_FLUSH_INTERVAL seconds, so a live exam costs one
+# small write per session per interval at most rather than one per heartbeat.
+
+
+class QuizSessionError(Exception):
+    pass
+
+
+class SessionExpired(QuizSessionError):
+    pass
+
+
+def _grace():
+    return timedelta(seconds=current_app.config.get('QUIZ_DEADLINE_GRACE', 30))
+
+
+def _entry(session):
+    return {
+        'id': session.id,
+        'token': session.token,
+        'user_id': session.user_id,
+        'quiz_id': session.quiz_id,
+        'deadline': session.deadline,
+        'question_set_id': session.question_set_id,
+        'seed': session.seed,
+        'answers': session.answers or {},
+        'saved_on': session.saved_on,
+        'submitted': session.submitted_on is not None,
+        'dirty': False,
+    }
+
+
+# In-memory autosave store for the sessions this process has seen
+class AutosaveStore:
+    def __init__(self, app, flush_interval=15):
+        self.app = app
+        self.flush_interval = flush_interval
+        self._entries = {}  # token -> entry dict
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='quiz-autosave', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # Cached session for a token, loaded from the database on first use
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+        if entry is not None:
+            return entry
+        session = QuizSession.query.filter_by(token=token).first()
+        if session is None:
+            return None
+        with self._lock:
+            return self._entries.setdefault(token, _entry(session))
+
+    def add(self, session):
+        with self._lock:
+            self._entries[session.token] = _entry(session)
+            return self._entries[session.token]
+
+    def save(self, entry, answers):
+        with self._lock:
+            entry['answers'] = answers
+            entry['saved_on'] = datetime.now()
+            entry['dirty'] = True
+
+    def mark_submitted(self, entry):
+        with self._lock:
+            if entry['submitted']:
+                return False
+            entry['submitted'] = True
+            entry['dirty'] = False
+            return True
+
+    def depth(self):
+        return len(self._entries)
+
+    def close(self):
+        if not self._stop.is_set():
+            self._stop.set()
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self._flush_safely()
+        self._flush_safely()
+
+    def _flush_safely(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Failed to flush autosaved quiz answers')
+
+    # Write every dirty entry back and forget sessions that are over
+    def flush(self):
+        now = datetime.now()
+        with self._lock:
+            dirty = [entry for entry in self._entries.values() if entry['dirty']]
+            params = [
+                {'b_id': entry['id'], 'b_answers': dict(entry['answers']), 'b_saved': entry['saved_on']}
+                for entry in dirty
+            ]
+            for entry in dirty:
+                entry['dirty'] = False
+            for token in [token for token, entry in self._entries.items()
+                          if not entry['dirty'] and (entry['submitted'] or entry['deadline'] < now)]:
+                del self._entries[token]
+        if not params:
+            return
+        # Never overwrite a submitted session or a newer autosave written by another worker
+        stmt = update(QuizSession.__table__).where(
+            QuizSession.id == bindparam('b_id'),
+            QuizSession.submitted_on.is_(None),
+            or_(QuizSession.saved_on.is_(None), QuizSession.saved_on < bindparam('b_saved')),
+        ).values(answers=bindparam('b_answers', type_=db.JSON), saved_on=bindparam('b_saved'))
+        with self.app.app_context():
+            try:
+                db.session.connection().execute(stmt, params)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                with self._lock:
+                    for entry in dirty:
+                        entry['dirty'] = True
+                raise
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+# Process-wide store, started on first use
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            app = current_app._get_current_object()
+            _store = AutosaveStore(app, flush_interval=app.config.get('QUIZ_AUTOSAVE_FLUSH_INTERVAL', 15))
+    return _store
+
+
+def remaining_seconds(entry):
+    return max(0, int((entry['deadline'] - datetime.now()).total_seconds()))
+
+
+# Resume the user's running session for the quiz, or start a new one with a fresh deadline
+def start_session(user_id, quiz):
+    now = datetime.now()
+    session = QuizSession.query.filter(
+        QuizSession.user_id == user_id,
+        QuizSession.quiz_id == quiz['id'],
+        QuizSession.submitted_on.is_(None),
+        QuizSession.deadline > now,
+    ).order_by(QuizSession.id.desc()).first()
+    store = get_store()
+    if session is not None:
+        return store.get(session.token)
+
+    session = QuizSession(
+        token=secrets.token_urlsafe(16),
+        user_id=user_id,
+        quiz_id=quiz['id'],
+        started_on=now,
+        deadline=now + timedelta(minutes=quiz['duration']),
+    )
+    # Randomized quizzes draw this attempt's questions now and keep them as a question set
+    if randomizer.is_randomized(quiz):
+        session.seed = secrets.randbits(31)
+        session.question_set_id = question_set_id(
+            db.session.connection(), quiz['id'], randomizer.draw(quiz, session.seed)
+        )
+    db.session.add(session)
+    db.session.commit()
+    return store.add(session)
+
+
+def _owned(token, user_id):
+    entry = get_store().get(token)
+    if entry is None or entry['user_id'] != user_id:
+        raise QuizSessionError('Unknown quiz session.')
+    if entry['submitted']:
+        raise QuizSessionError('This quiz attempt has already been submitted.')
+    return entry
+
+
+# Autosave in-progress answers ({question_id: option}, or None for a plain keep-alive);
+# returns the seconds left
+def heartbeat(token, user_id, answers=None):
+    entry = _owned(token, user_id)
+    if entry['deadline'] <= datetime.now():
+        raise SessionExpired('Time is up for this quiz attempt.')
+    if answers is not None:
+        get_store().save(entry, answers)
+    return remaining_seconds(entry)
+
+
+# Close the session for grading. Returns (entry, late); a late submission should be graded
+# from entry['answers'], the answers autosaved before the deadline.
+# The submission is claimed in the database, so only one worker can ever accept a token, and
+# the returned entry is the row as committed rather than this worker's cached copy.
+def finish(token, user_id, quiz_id):
+    store = get_store()
+    cached = _owned(token, user_id)
+    if cached['quiz_id'] != quiz_id:
+        raise QuizSessionError('Unknown quiz session.')
+    now = datetime.now()
+    try:
+        # Write this worker's unsaved answers first, unless another worker saved newer ones
+        if cached['dirty']:
+            db.session.execute(
+                update(QuizSession).where(
+                    QuizSession.id == cached['id'],
+                    QuizSession.submitted_on.is_(None),
+                    or_(QuizSession.saved_on.is_(None), QuizSession.saved_on < cached['saved_on']),
+                ).values(answers=dict(cached['answers']), saved_on=cached['saved_on']),
+                execution_options={'synchronize_session': False}
+            )
+        claimed = db.session.execute(
+            update(QuizSession).where(QuizSession.token == token, QuizSession.submitted_on.is_(None))
+            .values(submitted_on=now),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        session = db.session.query(QuizSession).populate_existing().filter_by(token=token).one()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    store.mark_submitted(cached)
+    if not claimed:
+        raise QuizSessionError('This quiz attempt has already been submitted.')
+    entry = _entry(session)
+    return entry, now > entry['deadline'] + _grace()
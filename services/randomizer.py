@@ -0,0 +1,111 @@
+import random
+import time
+from flask import current_app
+from models.analytics import ItemStats
+from services import catalog, item_analysis
+from services.answer_key import get_question_set
+from services.cache import LRUCache
+
+# Randomized question delivery.
+# Each quiz's question ids are kept in memory as difficulty strata (hard / medium / easy /
+# not yet rated, from the item analysis p-values). A draw allocates the sample across the
+# strata in proportion to their size and samples each with a per-attempt seed, so no query
+# touches the Question table. The drawn ids are stored with the quiz session as a question set
+# in canonical (ascending) order, so attempts that draw the same questions share one set; the
+# question order and option order are derived from the seed whenever they are needed.
+
+HARD_BELOW = 0.4
+EASY_ABOVE = 0.75
+OPTIONS = (1, 2, 3, 4)
+
+_pools = LRUCache(max_size=1024)  # quiz_id -> (catalog version, built at, strata)
+
+
+def is_randomized(quiz):
+    return bool(quiz.get('sample_size') or quiz.get('shuffle'))
+
+
+def _build_strata(quiz_id):
+    correct = {question['id']: question['correct_option'] for question in catalog.get_questions(quiz_id)}
+    p_values = {}
+    for row in ItemStats.query.filter(ItemStats.question_id.in_(list(correct))):
+        if row.attempts >= item_analysis.MIN_ATTEMPTS:
+            p_values[row.question_id] = getattr(row, f'chosen_{correct[row.question_id]}') / row.attempts
+
+    strata = ([], [], [], [])
+    for question_id in correct:
+        p_value = p_values.get(question_id)
+        if p_value is None:
+            strata[3].append(question_id)
+        elif p_value < HARD_BELOW:
+            strata[0].append(question_id)
+        elif p_value > EASY_ABOVE:
+            strata[2].append(question_id)
+        else:
+            strata[1].append(question_id)
+    return strata
+
+
+# Difficulty strata of a quiz, rebuilt when the catalog changes or after RANDOMIZER_POOL_TTL
+# seconds so the strata follow the item statistics
+def get_strata(quiz_id):
+    version = catalog.current_version()
+    entry = _pools.get(quiz_id)
+    ttl = current_app.config.get('RANDOMIZER_POOL_TTL', 300)
+    if entry is not None and entry[0] == version and entry[1] > time.monotonic() - ttl:
+        return entry[2]
+    strata = _build_strata(quiz_id)
+    _pools.set(quiz_id, (version, time.monotonic(), strata))
+    return strata
+
+
+# Split count across pools in proportion to their sizes (largest remainder)
+def _allocate(count, sizes):
+    total = sum(sizes)
+    quotas = [count * size // total for size in sizes]
+    remainders = sorted(range(len(sizes)), key=lambda i: (-(count * sizes[i] % total), i))
+    for i in remainders[:count - sum(quotas)]:
+        quotas[i] += 1
+    return quotas
+
+
+# Question ids drawn for one attempt, in canonical (ascending) order; the same seed gives the
+# same draw for the same strata
+def draw(quiz, seed):
+    strata = get_strata(quiz['id'])
+    total = sum(len(stratum) for stratum in strata)
+    count = min(quiz.get('sample_size') or total, total)
+    if count < total:
+        rng = random.Random(seed)
+        question_ids = []
+        for stratum, quota in zip(strata, _allocate(count, [len(stratum) for stratum in strata])):
+            question_ids.extend(rng.sample(stratum, quota))
+    else:
+        question_ids = [question_id for stratum in strata for question_id in stratum]
+    return sorted(question_ids)
+
+
+# Display order of the questions of one attempt
+def question_order(quiz, seed, question_ids):
+    order = sorted(question_ids)
+    if quiz.get('shuffle') and seed is not None:
+        random.Random(f'{seed}-questions').shuffle(order)
+    return order
+
+
+# Display order of the options of one question in an attempt
+def option_order(quiz, seed, question_id):
+    if not quiz.get('shuffle') or seed is None:
+        return list(OPTIONS)
+    order = list(OPTIONS)
+    random.Random(f'{seed}-{question_id}').shuffle(order)
+    return order
+
+
+# Question dicts of a randomized attempt in display order, each with the option order to show
+def served_questions(quiz, question_set_id, seed):
+    by_id = {question['id']: question for question in catalog.get_questions(quiz['id'])}
+    return [
+        dict(by_id[question_id], options=option_order(quiz, seed, question_id))
+        for question_id in question_order(quiz, seed, get_question_set(question_set_id)) if question_id in by_id
+    ]
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+# Sliding-window rate limiter keyed by arbitrary strings (username, client IP).
+# At most max_keys keys are tracked; the least recently used are forgotten first.
+class RateLimiter:
+    def __init__(self, limit, window, max_keys=100000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._hits = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _expire(self, hits, now):
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+
+    # Record one attempt for key; returns False if key is over its limit
+    def hit(self, key):
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                hits = self._hits[key] = deque()
+                while len(self._hits) > self.max_keys:
+                    self._hits.popitem(last=False)
+            else:
+                self._hits.move_to_end(key)
+            self._expire(hits, now)
+            if len(hits) >= self.limit:
+                self.rejected += 1
+                return False
+            hits.append(now)
+            return True
+
+    # True if key is at its limit, without recording an attempt
+    def exceeded(self, key):
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                return False
+            self._expire(hits, time.monotonic())
+            if len(hits) >= self.limit:
+                self.rejected += 1
+                return True
+            return False
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+# Process-wide limiter for a config key holding (attempts, seconds)
+def get_limiter(config_key):
+    from flask import current_app
+    with _limiters_lock:
+        limiter = _limiters.get(config_key)
+        if limiter is None:
+            limit, window = current_app.config[config_key]
+            limiter = _limiters[config_key] = RateLimiter(limit, window)
+        return limiter
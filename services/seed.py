@@ -0,0 +1,191 @@
+import hashlib
+from datetime import date, datetime, time, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import func, insert, select
+from werkzeug.security import generate_password_hash
+from models import db
+from models.subject import Subject
+from models.chapter import Chapter
+from models.quiz import Quiz, Question, UserQuizProgress
+from models.user import User
+from models.question_set import QuestionSet, pack_question_ids
+from services import analytics, catalog
+
+# Synthetic catalogs and attempt histories for scaling experiments.
+# Everything is generated from one NumPy generator, so a seed always produces the same content
+# (ids continue after the rows already in the database). Scores follow a logistic model of user
+# ability against question difficulty, which gives the spread of easy, hard and discriminating
+# items a real cohort produces. Rows go in as batched core inserts on one connection with
+# loading pragmas, and the secondary indexes of user_quiz_progress are rebuilt once at the end.
+
+OPTION_TEXTS = ('Alpha', 'Beta', 'Gamma', 'Delta')
+UNANSWERED_RATE = 0.04
+HISTORY_DAYS = 180
+
+
+class SeedError(Exception):
+    pass
+
+
+def _next_id(connection, model):
+    return (connection.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _loading_mode(connection, enabled):
+    if connection.dialect.name == 'sqlite':
+        # Skip the fsyncs and keep temp b-trees in memory; a crash mid-seed only loses the seed
+        connection.exec_driver_sql('PRAGMA synchronous=OFF' if enabled else 'PRAGMA synchronous=NORMAL')
+    elif connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql('SET synchronous_commit TO OFF' if enabled else 'RESET synchronous_commit')
+    connection.commit()
+
+
+def _insert(connection, model, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        connection.execute(insert(model), rows[start:start + batch_size])
+
+
+def _catalog(connection, rng, subjects, chapters, quizzes, questions, batch_size, today):
+    subject_id, chapter_id = _next_id(connection, Subject), _next_id(connection, Chapter)
+    quiz_id, question_id = _next_id(connection, Quiz), _next_id(connection, Question)
+    chapter_count, quiz_count = subjects * chapters, subjects * chapters * quizzes
+    question_count = quiz_count * questions
+
+    _insert(connection, Subject, [
+        {'id': subject_id + s, 'name': f'Subject {subject_id + s}', 'description': 'Generated subject'}
+        for s in range(subjects)
+    ], batch_size)
+    _insert(connection, Chapter, [
+        {'id': chapter_id + c, 'name': f'Chapter {chapter_id + c}', 'subject_id': subject_id + c // chapters,
+         'description': 'Generated chapter'}
+        for c in range(chapter_count)
+    ], batch_size)
+    durations = rng.choice([10, 15, 20, 30, 45, 60], size=quiz_count)
+    _insert(connection, Quiz, [
+        {'id': quiz_id + q, 'title': f'Quiz {quiz_id + q}', 'chapter_id': chapter_id + q // quizzes,
+         'date': today, 'duration': int(durations[q])}
+        for q in range(quiz_count)
+    ], batch_size)
+
+    correct = rng.integers(1, 5, size=question_count)
+    # Most items are moderately easy, with a tail of hard ones
+    difficulty = rng.normal(-0.5, 1.0, size=question_count)
+    question_ids = np.arange(question_id, question_id + question_count)
+    _insert(connection, Question, [
+        {'id': int(question_ids[i]), 'quiz_id': quiz_id + i // questions,
+         'question_text': f'Generated question {i % questions + 1} of quiz {quiz_id + i // questions}?',
+         'option_1': OPTION_TEXTS[0], 'option_2': OPTION_TEXTS[1], 'option_3': OPTION_TEXTS[2],
+         'option_4': OPTION_TEXTS[3], 'correct_option': int(correct[i])}
+        for i in range(question_count)
+    ], batch_size)
+
+    # Every quiz's full question set, as get_answer_key would register it
+    sets = []
+    for q in range(quiz_count):
+        packed = pack_question_ids(question_ids[q * questions:(q + 1) * questions].tolist())
+        sets.append({'quiz_id': quiz_id + q, 'digest': hashlib.sha1(packed).hexdigest(), 'question_ids': packed})
+    _insert(connection, QuestionSet, sets, batch_size)
+    set_ids = dict(connection.execute(
+        select(QuestionSet.quiz_id, QuestionSet.id).where(QuestionSet.quiz_id >= quiz_id)
+    ).all())
+    set_id_of = np.array([set_ids[quiz_id + q] for q in range(quiz_count)])
+    return quiz_id, quiz_count, correct.reshape(quiz_count, questions), difficulty.reshape(quiz_count, questions), set_id_of
+
+
+def _attempts(rng, abilities, quiz_count, attempts, correct, difficulty):
+    users = len(abilities)
+    # attempts distinct quizzes per user: the smallest keys of a random matrix
+    quiz_index = np.argpartition(rng.random((users, quiz_count)), attempts - 1, axis=1)[:, :attempts].ravel()
+    ability = np.repeat(abilities, attempts)[:, None]
+    item_correct = correct[quiz_index]
+    p_correct = 1 / (1 + np.exp(difficulty[quiz_index] - ability))
+    right = rng.random(item_correct.shape) < p_correct
+    wrong_option = (item_correct - 1 + rng.integers(1, 4, size=item_correct.shape)) % 4 + 1
+    answers = np.where(right, item_correct, wrong_option).astype(np.uint8)
+    unanswered = rng.random(item_correct.shape) < UNANSWERED_RATE
+    answers[unanswered] = 0
+    right &= ~unanswered
+    scores = np.rint(right.mean(axis=1) * 100).astype(np.int64)
+    return quiz_index, answers, scores
+
+
+# Generate a catalog and attempt history into the configured database.
+# progress(message) is called after each stage. Returns the number of rows inserted per table.
+def generate(seed, subjects=10, chapters=10, quizzes=10, questions=20, users=10000, attempts=10,
+             password='password', batch_size=10000, progress=None):
+    if min(subjects, chapters, quizzes, questions) < 1 or users < 0 or attempts < 0:
+        raise SeedError('Catalog sizes must be at least 1 and user counts may not be negative.')
+    quiz_total = subjects * chapters * quizzes
+    if attempts > quiz_total:
+        raise SeedError(f'Cannot give each user {attempts} attempts with only {quiz_total} quizzes.')
+    report = progress or (lambda message: None)
+    prefix = f'seed{seed}-'
+    if db.session.query(User.id).filter(User.username.like(f'{prefix}%')).first() is not None:
+        raise SeedError(f'Users from seed {seed} already exist; pick another seed.')
+    db.session.rollback()
+
+    rng = np.random.default_rng(seed)
+    today = date.today()
+    history_end = datetime.combine(today, time())
+    progress_indexes = list(UserQuizProgress.__table__.indexes)
+    counts = {}
+    with db.engine.connect() as connection:
+        _loading_mode(connection, True)
+        try:
+            quiz_id, quiz_count, correct, difficulty, set_id_of = _catalog(
+                connection, rng, subjects, chapters, quizzes, questions, batch_size, today
+            )
+            connection.commit()
+            counts.update(subjects=subjects, chapters=subjects * chapters, quizzes=quiz_count,
+                          questions=quiz_count * questions)
+            report(f'Catalog: {quiz_count} quizzes, {quiz_count * questions} questions')
+
+            user_id = _next_id(connection, User)
+            # One shared hash; hashing every password would dominate the run
+            password_hash = generate_password_hash(password, current_app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256'))
+            _insert(connection, User, [
+                {'id': user_id + u, 'username': f'{prefix}{u}', 'password': password_hash,
+                 'full_name': f'Generated User {user_id + u}', 'qualification': 'Graduate',
+                 'dob': date(1995, 1, 1) + timedelta(days=u * 7919 % 3650), 'role': 'user'}
+                for u in range(users)
+            ], batch_size)
+            connection.commit()
+            counts['users'] = users
+            report(f'Users: {users}')
+
+            # Index maintenance per row dominates large loads; rebuild the secondary indexes once
+            for index in progress_indexes:
+                index.drop(connection, checkfirst=True)
+            connection.commit()
+            abilities = rng.normal(0, 1, size=users)
+            users_per_batch = max(1, min(batch_size // max(attempts, 1), 4000000 // quiz_count))
+            inserted = 0
+            for start in range(0, users if attempts else 0, users_per_batch):
+                batch_abilities = abilities[start:start + users_per_batch]
+                quiz_index, answers, scores = _attempts(rng, batch_abilities, quiz_count, attempts, correct, difficulty)
+                user_ids = np.repeat(np.arange(user_id + start, user_id + start + len(batch_abilities)), attempts)
+                seconds = rng.integers(1, HISTORY_DAYS * 86400, size=len(user_ids))
+                connection.execute(insert(UserQuizProgress), [
+                    {'user_id': int(user_ids[i]), 'quiz_id': quiz_id + int(quiz_index[i]), 'score': int(scores[i]),
+                     'completed_on': history_end - timedelta(seconds=int(seconds[i])),
+                     'question_set_id': int(set_id_of[quiz_index[i]]), 'answers': answers[i].tobytes()}
+                    for i in range(len(user_ids))
+                ])
+                connection.commit()
+                inserted += len(user_ids)
+                if inserted // 100000 > (inserted - len(user_ids)) // 100000 or start + users_per_batch >= users:
+                    report(f'Attempts: {inserted}')
+            counts['attempts'] = inserted
+        finally:
+            connection.rollback()
+            for index in progress_indexes:
+                index.create(connection, checkfirst=True)
+            _loading_mode(connection, False)
+
+    # The rollups are cheaper to recompute from scratch than to update row by row
+    analytics.rebuild()
+    catalog.bump_version()
+    db.session.commit()
+    report('Analytics rollups rebuilt')
+    return counts
@@ -0,0 +1,295 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from models import db
+from models.dialect import upsert_insert
+from models.quiz import UserQuizProgress
+from services import analytics
+from services.dashboard import invalidate_summary
+
+try:
+    import fcntl
+except ImportError:  # Windows: journals cannot be locked, so only one process may use the queue
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+# Write-behind queue for quiz attempts.
+# submit() appends the graded attempt to a local journal file and hands it to a background
+# worker, which upserts whole batches of attempts in one transaction. Concurrent submitters
+# therefore share a single SQLite write instead of queueing on the write lock one by one.
+# Journals left behind by a crashed process are replayed by the next process that starts.
+# Attempts the database rejects outright (e.g. for a quiz deleted meanwhile) are moved to
+# dead-letter.jsonl in the journal directory instead of blocking the queue.
+# The journal is only appended to while attempts are queued. It is emptied once every queued
+# attempt is committed, and rewritten early only when committed attempts take up most of it,
+# so a backlog costs amortised constant journal writes per attempt. Attempts still in the
+# journal after a crash are replayed; the upsert keeps the newest attempt either way.
+class SubmissionQueue:
+    def __init__(self, app, journal_dir, batch_size=200, flush_interval=0.05, fsync=True):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._pending = []  # (record, Submission) in submission order
+        self._committed_bytes = 0  # Journal bytes at the head of the file that are already committed
+        self._cond = threading.Condition()
+        self._stopping = False
+
+        os.makedirs(journal_dir, exist_ok=True)
+        self._journal_path = os.path.join(journal_dir, f'submissions-{os.getpid()}.jsonl')
+        self._dead_letter_path = os.path.join(journal_dir, 'dead-letter.jsonl')
+        self._journal = open(self._journal_path, 'a+', encoding='utf-8')
+        if fcntl:
+            fcntl.flock(self._journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        # A reused pid may inherit the journal of a dead process
+        self._journal.seek(0)
+        self._pending.extend((json.loads(line), Submission()) for line in self._journal if line.strip())
+        self._replay_orphans(journal_dir)
+
+        self._thread = threading.Thread(target=self._run, name='submission-queue', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # Queue one attempt; returns a Submission that is set once the attempt is committed or rejected
+    # answers is the packed answer vector for the question set (see models.question_set)
+    def submit(self, user_id, quiz_id, score, completed_on, question_set_id, answers):
+        record = {
+            'user_id': user_id,
+            'quiz_id': quiz_id,
+            'score': score,
+            'completed_on': completed_on.isoformat(),
+            'question_set_id': question_set_id,
+            'answers': answers.hex(),
+        }
+        committed = Submission()
+        with self._cond:
+            self._write_journal([record])
+            self._pending.append((record, committed))
+            self._cond.notify()
+        return committed
+
+    def depth(self):
+        return len(self._pending)
+
+    # Stop the worker after flushing everything still queued
+    def close(self):
+        with self._cond:
+            if self._stopping:
+                return
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+        self._journal.close()
+        if not self._pending:
+            os.remove(self._journal_path)
+
+    def _write_journal(self, records):
+        for record in records:
+            self._journal.write(json.dumps(record) + '\n')
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    # Claim journals of processes that are gone (their file lock is free) and requeue them
+    def _replay_orphans(self, journal_dir):
+        for path in glob.glob(os.path.join(journal_dir, 'submissions-*.jsonl')):
+            if path == self._journal_path or not os.path.getsize(path):
+                continue  # Empty journals may belong to a worker that is just starting
+            with open(path, encoding='utf-8') as journal:
+                if fcntl:
+                    try:
+                        fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # Still owned by a live worker
+                records = [json.loads(line) for line in journal if line.strip()]
+                os.remove(path)  # Removed while still locked, so no other process replays it too
+            if records:
+                self._write_journal(records)
+                self._pending.extend((record, Submission()) for record in records)
+                logger.info('Replaying %d queued submissions from %s', len(records), path)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+            # Give concurrent submitters a moment to join this batch (group commit)
+            if not self._stopping:
+                time.sleep(self.flush_interval)
+            with self._cond:
+                batch = self._pending[:self.batch_size]
+            rejected = []
+            try:
+                try:
+                    self._flush([record for record, _ in batch])
+                except IntegrityError:
+                    # Find the offending attempts so the rest of the batch still commits
+                    logger.warning('Batch of %d submissions violated a constraint; retrying one by one', len(batch))
+                    rejected = self._flush_each(batch)
+            except Exception:
+                logger.exception('Failed to flush %d queued submissions', len(batch))
+                if self._stopping:
+                    return  # Leave the journal in place for the next process to replay
+                time.sleep(1)
+                continue
+            with self._cond:
+                if rejected:
+                    self._dead_letter(rejected)
+                del self._pending[:len(batch)]
+                self._compact_journal(batch)
+            errors = {id(record): error for record, error in rejected}
+            for record, committed in batch:
+                if id(record) in errors:
+                    committed.error = errors[id(record)]
+                else:
+                    invalidate_summary(record['user_id'])
+                committed.set()
+
+    # Flush a batch one attempt at a time; returns (record, error) for those the database rejects
+    def _flush_each(self, batch):
+        rejected = []
+        for record, _ in batch:
+            try:
+                self._flush([record])
+            except IntegrityError as e:
+                logger.error('Dropping submission of user %s for quiz %s: %s',
+                             record['user_id'], record['quiz_id'], e.orig)
+                rejected.append((record, str(e.orig)))
+        return rejected
+
+    def _dead_letter(self, rejected):
+        with open(self._dead_letter_path, 'a', encoding='utf-8') as dead_letter:
+            for record, error in rejected:
+                dead_letter.write(json.dumps(dict(record, error=error)) + '\n')
+            dead_letter.flush()
+            if self.fsync:
+                os.fsync(dead_letter.fileno())
+
+    # Drop the batch just committed from the journal: empty it once nothing is pending, and
+    # rewrite it with the pending attempts only when committed ones fill most of the file
+    def _compact_journal(self, batch):
+        self._committed_bytes += sum(len(json.dumps(record)) + 1 for record, _ in batch)
+        if self._pending and self._committed_bytes * 2 < os.fstat(self._journal.fileno()).st_size:
+            return
+        self._journal.seek(0)
+        self._journal.truncate()
+        self._committed_bytes = 0
+        self._write_journal([record for record, _ in self._pending])
+
+    # Upsert one batch of attempts in a single transaction; the latest attempt per user and quiz wins.
+    def _flush(self, records):
+        submitted = [_row(record) for record in records]
+        latest = {}
+        for row in submitted:
+            latest[(row['user_id'], row['quiz_id'])] = row
+
+        with self.app.app_context():
+            try:
+                rows = list(latest.values())
+                # Rollups first: they read the scores the upsert is about to replace. Daily
+                # activity counts every submission, including retakes collapsed in this batch.
+                analytics.record_attempts(rows, submitted)
+                upsert_attempts(rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+
+# Column values for a journal record. Records journaled before the compact answers format
+# carry a user_answers dict instead; they are stored as legacy JSON for upgrade-db to convert.
+def _row(record):
+    return {
+        'user_id': record['user_id'],
+        'quiz_id': record['quiz_id'],
+        'score': record['score'],
+        'completed_on': datetime.fromisoformat(record['completed_on']),
+        'question_set_id': record.get('question_set_id'),
+        'answers': bytes.fromhex(record['answers']) if record.get('answers') is not None else None,
+        'user_answers': record.get('user_answers'),
+    }
+
+
+# One multi-row INSERT ... ON CONFLICT (user_id, quiz_id) DO UPDATE for a list of attempts.
+# An existing row is only replaced by a newer attempt, so replayed journal entries are harmless.
+def upsert_attempts(rows):
+    if not rows:
+        return
+    stmt = upsert_insert(UserQuizProgress).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserQuizProgress.user_id, UserQuizProgress.quiz_id],
+        set_={
+            'score': stmt.excluded.score,
+            'completed_on': stmt.excluded.completed_on,
+            'question_set_id': stmt.excluded.question_set_id,
+            'answers': stmt.excluded.answers,
+            'user_answers': stmt.excluded.user_answers,
+        },
+        where=UserQuizProgress.completed_on <= stmt.excluded.completed_on,
+    )
+    db.session.execute(stmt)
+
+
+# Set once a queued attempt is committed, or with error holding the database's reason once it
+# has been dead-lettered
+class Submission(threading.Event):
+    def __init__(self):
+        super().__init__()
+        self.error = None
+
+
+class SubmissionRejected(Exception):
+    pass
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+# Process-wide queue, started on first use
+def get_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            app = current_app._get_current_object()
+            _queue = SubmissionQueue(
+                app,
+                journal_dir=os.path.join(app.instance_path, 'submissions'),
+                batch_size=app.config.get('SUBMISSION_BATCH_SIZE', 200),
+                flush_interval=app.config.get('SUBMISSION_FLUSH_INTERVAL', 0.05),
+                fsync=app.config.get('SUBMISSION_JOURNAL_FSYNC', True),
+            )
+    return _queue
+
+
+# Queue an attempt without waiting. Returns (completed_on, Submission set once it is settled).
+def queue_attempt(user_id, quiz_id, score, question_set_id, answers):
+    completed_on = datetime.now()
+    return completed_on, get_queue().submit(user_id, quiz_id, score, completed_on, question_set_id, answers)
+
+
+# Queue an attempt and, in 'commit' acknowledgment mode, wait until it is in the database.
+# Returns True when the attempt is known to be committed; raises SubmissionRejected when the
+# database refused it.
+def record_attempt(user_id, quiz_id, score, question_set_id, answers):
+    _, committed = queue_attempt(user_id, quiz_id, score, question_set_id, answers)
+    if current_app.config.get('SUBMISSION_ACK', 'commit') == 'commit':
+        # End this request's read transaction first; an open SQLite reader would block the batch commit
+        db.session.rollback()
+        if not committed.wait(current_app.config.get('SUBMISSION_ACK_TIMEOUT', 10)):
+            return False
+        if committed.error is not None:
+            raise SubmissionRejected(committed.error)
+        return True
+    return False
@@ -0,0 +1,70 @@
+from datetime import datetime
+from flask import current_app
+from models import db
+from models.quiz import UserQuizProgress
+from services import quiz_sessions
+from services.answer_key import get_answer_key
+from services.cache import LRUCache
+from services.submission_queue import queue_attempt
+
+# Asynchronous submissions for the JSON API.
+# An attempt is graded on arrival (a few array comparisons) and handed to the write-behind
+# queue; the request returns a submission id at once instead of waiting for the batch commit.
+# The id encodes the quiz and the attempt's timestamp, so any worker can answer a poll from
+# UserQuizProgress; the worker that queued the attempt can also long-poll on its commit event.
+
+_waiting = LRUCache(max_size=10000)  # (user_id, submission_id) -> queue Submission
+
+
+def _encode_id(quiz_id, completed_on):
+    return f'{quiz_id}-{completed_on:%Y%m%d%H%M%S%f}'
+
+
+# Raises ValueError for a malformed id
+def _decode_id(submission_id):
+    quiz_id, _, stamp = submission_id.partition('-')
+    return int(quiz_id), datetime.strptime(stamp, '%Y%m%d%H%M%S%f')
+
+
+# Grade and queue one attempt; answers is {question_id: option}.
+# Returns (submission_id, late); raises quiz_sessions.QuizSessionError for a bad session token.
+def submit(user_id, quiz_id, session_token, answers):
+    quiz_session, late = quiz_sessions.finish(session_token, user_id, quiz_id)
+    answer_key = get_answer_key(quiz_id, quiz_session['question_set_id'])
+    # Past the deadline only the answers autosaved in time count
+    vector = answer_key.answers_from_dict(quiz_session['answers'] if late else answers)
+    completed_on, committed = queue_attempt(
+        user_id, quiz_id, answer_key.score(vector), answer_key.question_set_id, vector.tobytes()
+    )
+    submission_id = _encode_id(quiz_id, completed_on)
+    _waiting.set((user_id, submission_id), committed)
+    return submission_id, late
+
+
+# Status of a submission, waiting up to `wait` seconds for its commit when this worker queued it.
+# Raises ValueError for a malformed id.
+def result(user_id, submission_id, wait=0):
+    quiz_id, completed_on = _decode_id(submission_id)
+    committed = _waiting.get((user_id, submission_id))
+    if committed is not None and not committed.is_set() and wait > 0:
+        # End this request's read transaction first; an open SQLite reader would block the batch commit
+        db.session.rollback()
+        committed.wait(min(wait, current_app.config.get('SUBMISSION_POLL_MAX_WAIT', 25)))
+    if committed is not None and committed.error is not None:
+        # Dead-lettered by the queue; it will never reach UserQuizProgress
+        _waiting.pop((user_id, submission_id))
+        return {'submission_id': submission_id, 'status': 'rejected', 'quiz_id': quiz_id}
+
+    row = db.session.query(UserQuizProgress.score, UserQuizProgress.completed_on)\
+        .filter_by(user_id=user_id, quiz_id=quiz_id).first()
+    if row is None or row.completed_on < completed_on:
+        return {'submission_id': submission_id, 'status': 'pending'}
+    _waiting.pop((user_id, submission_id))
+    return {
+        'submission_id': submission_id,
+        'status': 'graded',
+        'quiz_id': quiz_id,
+        'score': row.score,
+        # A later attempt at the same quiz has replaced this one
+        'superseded': row.completed_on > completed_on,
+    }
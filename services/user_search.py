@@ -0,0 +1,57 @@
+from sqlalchemy import Integer, column, or_, text
+from sqlalchemy.exc import OperationalError
+from models import db
+from models.user import User
+
+PAGE_SIZE = 25
+# The trigram tokenizer cannot match terms shorter than three characters
+MIN_FTS_TERM = 3
+
+
+def _fts_query(search_query):
+    terms = search_query.split()
+    if not terms or any(len(term) < MIN_FTS_TERM for term in terms):
+        return None
+    # Quote every term so user input is never parsed as FTS5 syntax
+    return ' AND '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def _like_filter(search_query):
+    pattern = f'%{search_query}%'
+    return or_(User.full_name.ilike(pattern), User.username.ilike(pattern))
+
+
+def _search_filter(search_query):
+    fts_query = _fts_query(search_query) if db.engine.dialect.name == 'sqlite' else None
+    if fts_query is None:
+        # PostgreSQL answers ILIKE from the pg_trgm indexes; short SQLite terms fall back to a scan
+        return _like_filter(search_query)
+    return User.id.in_(
+        text('SELECT rowid FROM user_search WHERE user_search MATCH :fts_query')
+        .bindparams(fts_query=fts_query)
+        .columns(column('rowid', Integer))
+    )
+
+
+# One page of users ordered by id, optionally filtered by a search over username and full name.
+# Keyset pagination: pass the last id of the previous page as after_id.
+# Returns (users, next_after_id); next_after_id is None on the last page.
+def search_users(search_query='', after_id=None, limit=PAGE_SIZE):
+    query = User.query
+    if after_id:
+        query = query.filter(User.id > after_id)
+    search_query = search_query.strip()
+    if search_query:
+        query = query.filter(_search_filter(search_query))
+    query = query.order_by(User.id).limit(limit + 1)
+    try:
+        users = query.all()
+    except OperationalError:
+        # The FTS table has not been created yet (run `flask upgrade-db`)
+        db.session.rollback()
+        users = User.query.filter(User.id > (after_id or 0), _like_filter(search_query))\
+            .order_by(User.id).limit(limit + 1).all()
+
+    if len(users) > limit:
+        return users[:limit], users[limit - 1].id
+    return users, None
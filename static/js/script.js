@@ -1,32 +1,60 @@
+// Quiz forms with a data-api-url are submitted through the JSON submission API:
+// the POST returns a submission id straight away and the score is long-polled from result_url.
+document.querySelectorAll('form[data-api-url]').forEach(form => {
+    form.addEventListener('submit', async event => {
+        event.preventDefault();
+        const formData = new FormData(form);
 
-// document.querySelectorAll('.quiz-form').forEach(form => {
-//     form.addEventListener('submit', async event => {
-//         event.preventDefault();
-//         const formData = new FormData(form);
+        let submission;
+        try {
+            const response = await fetch(form.dataset.apiUrl, {
+                method: 'POST',
+                body: formData,
+            });
+            submission = await response.json();
+            if (!response.ok) {
+                showToast(submission.error || 'Submission failed.', 'error');
+                return;
+            }
+        } catch (error) {
+            // The API could not be reached; fall back to a regular form post
+            form.submit();
+            return;
+        }
 
-//         try {
-//             const response = await fetch(form.action, {
-//                 method: 'POST',
-//                 body: formData,
-//             });
+        if (submission.late) {
+            showToast('Time was up. Your answers saved before the deadline have been graded.', 'error');
+        }
+        const result = await pollResult(submission.result_url);
+        if (result && result.status === 'graded') {
+            showToast(`Quiz submitted successfully! Your score: ${Math.round(result.score)}%`, 'success');
+        } else {
+            showToast('Quiz submitted successfully! Your score will appear shortly.', 'success');
+        }
+        setTimeout(() => { window.location = form.dataset.doneUrl || '/'; }, 1500);
+    });
+});
 
-//             const result = await response.json();
-//             if (result.success) {
-//                 document.querySelector(`#score-${result.quiz_id}`).textContent = `${result.score}`;
-//                 showToast('Quiz submitted successfully!', 'success');
-//             } else {
-//                 showToast(result.message, 'error');
-//             }
-//         } catch (error) {
-//             showToast('An error occurred. Please try again.', 'error');
-//         }
-//     });
-// });
+async function pollResult(url, attempts = 5) {
+    for (let i = 0; i < attempts; i++) {
+        try {
+            const response = await fetch(`${url}?wait=10`);
+            const result = await response.json();
+            if (result.status === 'graded') {
+                return result;
+            }
+        } catch (error) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    }
+    return null;
+}
 
-// function showToast(message, type) {
-//     const toast = document.createElement('div');
-//     toast.className = `toast ${type}`;
-//     toast.textContent = message;
-//     document.body.appendChild(toast);
-//     setTimeout(() => toast.remove(), 3000);
-// }
\ No newline at end of file
+function showToast(message, type) {
+    const toast = document.createElement('div');
+    toast.className = `alert alert-${type === 'success' ? 'success' : 'danger'} position-fixed top-0 end-0 m-3`;
+    toast.style.zIndex = 1080;
+    toast.textContent = message;
+    document.body.appendChild(toast);
+    setTimeout(() => toast.remove(), 3000);
+}
@@ -0,0 +1,71 @@
+import os
+import sys
+from datetime import date
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import Config
+from models import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "quiz_master.db"}'
+        PASSWORD_HASH_WORKERS = 0
+
+    app = create_app(TestConfig)
+    app.instance_path = str(tmp_path)
+    with app.app_context():
+        from models.schema import upgrade_schema
+        upgrade_schema()
+        yield app
+        db.session.remove()
+    _reset_process_state()
+
+
+# The services keep per-process caches and background workers; each test gets a fresh database
+def _reset_process_state():
+    from services import answer_key, catalog, dashboard, identity, leaderboards, quiz_sessions, randomizer, rate_limit, submission_queue
+    for service, name in ((quiz_sessions, '_store'), (submission_queue, '_queue')):
+        worker = getattr(service, name)
+        if worker is not None:
+            worker.close()
+            setattr(service, name, None)
+    catalog._cache = identity._cache = leaderboards._boards = None
+    for cache in (answer_key._question_sets, dashboard._summary_cache, randomizer._pools, rate_limit._limiters):
+        cache.clear()
+
+
+# Subjects with chapters, quizzes and questions inserted directly; returns the quiz ids
+def add_catalog(subjects, quizzes_per_subject=1, questions_per_quiz=2):
+    from models.subject import Subject
+    from models.chapter import Chapter
+    from models.quiz import Quiz, Question
+    quiz_ids = []
+    for s in range(subjects):
+        subject = Subject(name=f'Subject {s}', description='Test subject')
+        chapter = Chapter(name=f'Chapter {s}', subject=subject)
+        for q in range(quizzes_per_subject):
+            quiz = Quiz(title=f'Quiz {s}.{q}', chapter=chapter, date=date.today(), duration=30)
+            quiz.questions = [
+                Question(question_text=f'Question {i}?', option_1='A', option_2='B', option_3='C',
+                         option_4='D', correct_option=1)
+                for i in range(questions_per_quiz)
+            ]
+            db.session.add(quiz)
+        db.session.add(subject)
+    db.session.commit()
+    return [quiz_id for (quiz_id,) in db.session.query(Quiz.id).order_by(Quiz.id)]
+
+
+def add_user(username='student', password='x'):
+    from models.user import User
+    user = User(username=username, password=password, full_name='Test Student', qualification='B.Sc',
+                dob=date(2000, 1, 1), role='user')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
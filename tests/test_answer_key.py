@@ -0,0 +1,8 @@
+from services.answer_key import AnswerKey
+
+
+def test_answers_from_dict_ignores_non_numeric_ids_and_invalid_options():
+    key = AnswerKey(1, [10, 11, 12], [1, 2, 3])
+    answers = key.answers_from_dict({'10': 1, 'abc': 2, '11': '5', '12': '3', '99': 4})
+    assert list(answers) == [1, 0, 3]
+    assert key.grade(answers) == 2
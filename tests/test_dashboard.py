@@ -0,0 +1,27 @@
+from datetime import datetime
+from models import db
+from models.quiz import UserQuizProgress
+from services import dashboard
+from conftest import add_catalog, add_user
+
+
+def test_summary_picks_up_attempts_committed_by_another_worker(app):
+    first, second = add_catalog(1, quizzes_per_subject=2)
+    user_id = add_user()
+    db.session.add(UserQuizProgress(user_id=user_id, quiz_id=first, score=40, completed_on=datetime(2026, 1, 1)))
+    db.session.commit()
+    summary, etag = dashboard.load_summary(user_id)
+    assert dashboard.load_summary(user_id) == (summary, etag)
+
+    # Committed elsewhere: this worker's cache entry is never invalidated explicitly
+    db.session.add(UserQuizProgress(user_id=user_id, quiz_id=second, score=90, completed_on=datetime(2026, 1, 2)))
+    db.session.commit()
+    new_summary, new_etag = dashboard.load_summary(user_id)
+    assert new_etag != etag
+    assert [quiz['score'] for quiz in new_summary[0]['quizzes']] == [40, 90]
+
+    # A retake replaces the score in place
+    db.session.query(UserQuizProgress).filter_by(user_id=user_id, quiz_id=first)\
+        .update({'score': 70, 'completed_on': datetime(2026, 1, 3)})
+    db.session.commit()
+    assert [quiz['score'] for quiz in dashboard.load_summary(user_id)[0][0]['quizzes']] == [70, 90]
@@ -0,0 +1,73 @@
+from datetime import datetime
+from models import db
+from models.chapter import Chapter
+from models.quiz import Quiz, Question, UserQuizProgress
+from models.analytics import UserStats, QuizStats, SubjectStats, DailyStats, LeaderboardEntry
+from services import analytics, catalog, deletion
+from conftest import add_catalog, add_user
+
+ROLLUPS = (UserStats, QuizStats, SubjectStats, DailyStats, LeaderboardEntry)
+
+
+# Two subjects of two quizzes; one user attempted everything, another only the first subject
+def _attempted_catalog():
+    quiz_ids = add_catalog(2, quizzes_per_subject=2)
+    everywhere, first_only = add_user('everywhere'), add_user('first_only')
+    for i, quiz_id in enumerate(quiz_ids):
+        db.session.add(UserQuizProgress(user_id=everywhere, quiz_id=quiz_id, score=10 * (i + 1),
+                                        completed_on=datetime(2026, 1, 1 + i)))
+        if i < 2:
+            db.session.add(UserQuizProgress(user_id=first_only, quiz_id=quiz_id, score=50,
+                                            completed_on=datetime(2026, 1, 1)))
+    analytics.rebuild()
+    db.session.commit()
+    return quiz_ids, everywhere, first_only
+
+
+def _rollups():
+    return {model.__tablename__: sorted(tuple(row) for row in db.session.execute(db.select(*model.__table__.c)))
+            for model in ROLLUPS}
+
+
+def _assert_rollups_match_a_rebuild():
+    maintained = _rollups()
+    analytics.rebuild()
+    rebuilt = _rollups()
+    db.session.rollback()
+    # Daily activity keeps counting the removed attempts; it is a log of submissions
+    maintained.pop('daily_stats'), rebuilt.pop('daily_stats')
+    assert maintained == rebuilt
+
+
+def test_deleting_a_subject_removes_its_quizzes_and_attempts_from_the_rollups(app):
+    quiz_ids, everywhere, first_only = _attempted_catalog()
+    subject_id = db.session.get(Chapter, db.session.get(Quiz, quiz_ids[0]).chapter_id).subject_id
+
+    deletion.delete_subject(subject_id)
+    catalog.bump_version()
+    db.session.commit()
+
+    assert [quiz_id for (quiz_id,) in db.session.query(Quiz.id).order_by(Quiz.id)] == quiz_ids[2:]
+    assert db.session.query(Question).filter(Question.quiz_id.in_(quiz_ids[:2])).count() == 0
+    assert db.session.query(UserQuizProgress).filter(UserQuizProgress.quiz_id.in_(quiz_ids[:2])).count() == 0
+    assert db.session.get(SubjectStats, subject_id) is None
+    assert db.session.query(QuizStats).filter(QuizStats.quiz_id.in_(quiz_ids[:2])).count() == 0
+    # first_only has nothing left, so no rollup or leaderboard row remains for them
+    assert db.session.get(UserStats, first_only) is None
+    assert db.session.query(LeaderboardEntry).filter_by(user_id=first_only).count() == 0
+    assert (db.session.get(UserStats, everywhere).attempts, db.session.get(UserStats, everywhere).score_sum) == (2, 70)
+    _assert_rollups_match_a_rebuild()
+
+
+def test_deleting_a_chapter_removes_only_its_quizzes(app):
+    quiz_ids, everywhere, _ = _attempted_catalog()
+    chapter_id = db.session.get(Quiz, quiz_ids[2]).chapter_id
+
+    deletion.delete_chapter(chapter_id)
+    catalog.bump_version()
+    db.session.commit()
+
+    assert [quiz_id for (quiz_id,) in db.session.query(Quiz.id).order_by(Quiz.id)] == quiz_ids[:2]
+    assert db.session.get(Chapter, chapter_id) is None
+    assert db.session.query(UserQuizProgress).filter_by(user_id=everywhere).count() == 2
+    _assert_rollups_match_a_rebuild()
@@ -0,0 +1,25 @@
+from sqlalchemy import text
+from app import create_app
+from config import Config
+from models import db
+from models.engine import engine_options
+
+
+def test_in_memory_sqlite_gets_no_pool_sizing():
+    options = engine_options({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    assert 'pool_size' not in options and 'max_overflow' not in options
+
+    class MemoryConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+    app = create_app(MemoryConfig)
+    with app.app_context():
+        assert db.session.execute(text('SELECT 1')).scalar() == 1
+        db.session.remove()
+
+
+def test_file_and_server_databases_keep_pool_sizing(tmp_path):
+    for uri in (f'sqlite:///{tmp_path / "quiz.db"}', 'postgresql://quiz@localhost/quiz'):
+        options = engine_options({'SQLALCHEMY_DATABASE_URI': uri, 'DB_POOL_SIZE': 5})
+        assert options['pool_size'] == 5
@@ -0,0 +1,31 @@
+from models import db
+from models.quiz import Question
+from services import catalog, item_analysis
+from conftest import add_catalog
+
+
+def test_questions_with_an_invalid_correct_option_are_flagged_not_indexed(app):
+    quiz_id = add_catalog(1, questions_per_quiz=3)[0]
+    questions = Question.query.filter_by(quiz_id=quiz_id).order_by(Question.id).all()
+    questions[1].correct_option, questions[2].correct_option = 7, 0
+    catalog.bump_version()
+    db.session.commit()
+
+    items = item_analysis.analyse_quiz(quiz_id)
+    assert [item['flags'] for item in items] == [[], ['invalid_correct_option'], ['invalid_correct_option']]
+    assert items[1]['p_value'] is None
+
+
+def test_admin_rejects_a_correct_option_outside_one_to_four(app):
+    quiz_id = add_catalog(1, questions_per_quiz=1)[0]
+    question_id = Question.query.filter_by(quiz_id=quiz_id).one().id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+    form = {'question_text': 'New?', 'option_1': 'A', 'option_2': 'B', 'option_3': 'C', 'option_4': 'D',
+            'correct_option': '5'}
+
+    client.post(f'/admin/add_questions/{quiz_id}', data=form)
+    client.post(f'/admin/edit_question/{question_id}', data=form)
+    db.session.remove()
+    assert [(q.question_text, q.correct_option) for q in Question.query.filter_by(quiz_id=quiz_id)] == [('Question 0?', 1)]
@@ -0,0 +1,45 @@
+from models import db
+from models.analytics import LeaderboardEntry
+from services import leaderboards
+from conftest import add_user
+
+
+def _users(*names):
+    return [add_user(name) for name in names]
+
+
+def _ranks(scope='global', scope_id=0):
+    return [(row['user_id'], row['rank'], row['points']) for row in leaderboards.top(scope, scope_id)['entries']]
+
+
+def test_ties_share_a_rank_and_committed_deltas_reach_the_cached_board(app):
+    a, b, c, d = _users('a', 'b', 'c', 'd')
+    leaderboards.add_deltas({('global', 0, a): [1, 100], ('global', 0, b): [1, 80], ('global', 0, c): [1, 80]})
+    db.session.commit()
+    assert _ranks() == [(a, 1, 100), (b, 2, 80), (c, 2, 80)]
+    assert leaderboards.rank_of('global', 0, b) == {'rank': 2, 'points': 80, 'attempts': 1, 'total': 3}
+    assert leaderboards.rank_of('global', 0, d) is None
+
+    # The board is cached now; the next commit updates it in place rather than reloading it
+    board = leaderboards.get_board('global')
+    leaderboards.add_deltas({('global', 0, c): [1, 30], ('global', 0, d): [1, 80]})
+    db.session.commit()
+    assert leaderboards.get_board('global') is board
+    assert _ranks() == [(c, 1, 110), (a, 2, 100), (b, 3, 80), (d, 3, 80)]
+    assert [row['user_id'] for row in leaderboards.top('global', limit=2, offset=2)['entries']] == [b, d]
+    # A retake that lowers the score moves the user down
+    leaderboards.add_deltas({('global', 0, c): [0, -50]})
+    db.session.commit()
+    assert _ranks() == [(a, 1, 100), (b, 2, 80), (d, 2, 80), (c, 4, 60)]
+
+
+def test_rolled_back_deltas_leave_the_boards_unchanged(app):
+    a, b = _users('a', 'b')
+    leaderboards.add_deltas({('global', 0, a): [1, 50], ('quiz', 7, a): [1, 50]})
+    db.session.commit()
+    before = _ranks(), _ranks('quiz', 7)
+
+    leaderboards.add_deltas({('global', 0, b): [1, 90], ('quiz', 7, a): [0, 40]})
+    db.session.rollback()
+    assert (_ranks(), _ranks('quiz', 7)) == before
+    assert db.session.query(LeaderboardEntry).count() == 2
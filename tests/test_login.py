@@ -0,0 +1,65 @@
+from werkzeug.security import generate_password_hash
+from controllers import user_controller
+from services.passwords import HashTimeout
+from conftest import add_user
+
+
+def _login(client, username, password, ip='10.0.0.1'):
+    return client.post('/user/login', data={'username': username, 'password': password},
+                       environ_base={'REMOTE_ADDR': ip})
+
+
+def _limited_app(app, failures):
+    app.config['LOGIN_RATE_LIMIT_PER_IP'] = (failures, 60)
+    add_user('student', generate_password_hash('secret', 'pbkdf2:sha256:1000'))
+    return app.test_client()
+
+
+def test_successful_logins_do_not_count_against_the_client(app):
+    client = _limited_app(app, 2)
+    for _ in range(5):
+        assert _login(client, 'student', 'secret').status_code == 302
+
+
+def test_failed_logins_block_the_client(app):
+    client = _limited_app(app, 2)
+    assert _login(client, 'student', 'wrong').status_code == 200
+    assert _login(client, 'student', 'wrong').status_code == 200
+    assert _login(client, 'student', 'secret').status_code == 429
+    # Other clients are unaffected
+    assert _login(client, 'student', 'secret', ip='10.0.0.2').status_code == 302
+
+
+def test_registrations_use_their_own_bucket(app):
+    client = _limited_app(app, 1)
+    assert _login(client, 'student', 'wrong').status_code == 200
+    response = client.post('/user/register', data={
+        'username': 'new', 'password': 'pw', 'full_name': 'New Student', 'qualification': 'B.Sc', 'dob': '2000-01-01',
+    }, environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    assert response.headers['Location'].endswith('/user/login')
+
+
+def test_hash_timeout_is_reported_as_busy(app, monkeypatch):
+    client = _limited_app(app, 2)
+
+    def slow_check(password_hash, password):
+        raise HashTimeout()
+    monkeypatch.setattr(user_controller, 'check_password', slow_check)
+    assert _login(client, 'student', 'secret').status_code == 503
+
+
+def test_trusted_proxy_supplies_the_client_address():
+    from flask import request
+    from app import create_app
+    from config import Config
+
+    class ProxyConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+        TRUSTED_PROXIES = 1
+
+    proxied = create_app(ProxyConfig)
+    proxied.add_url_rule('/client-address', 'client_address', lambda: request.remote_addr)
+    response = proxied.test_client().get('/client-address', headers={'X-Forwarded-For': '203.0.113.7'},
+                                         environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    assert response.get_data(as_text=True) == '203.0.113.7'
@@ -0,0 +1,58 @@
+import csv
+import io
+import json
+from datetime import datetime
+from models import db
+from models.quiz import UserQuizProgress
+from services import progress_report
+from conftest import add_catalog, add_user
+
+
+# 8 users x 3 quizzes over two subjects, with only three distinct completion times
+def _attempts():
+    quiz_ids = add_catalog(2, quizzes_per_subject=2)[:3]
+    stamps = [datetime(2026, 5, 1, 9), datetime(2026, 5, 2, 9), datetime(2026, 5, 3, 9)]
+    for u in range(8):
+        user_id = add_user(f'user{u}')
+        for q, quiz_id in enumerate(quiz_ids):
+            db.session.add(UserQuizProgress(user_id=user_id, quiz_id=quiz_id, score=u * 10 + q,
+                                            completed_on=stamps[(u + q) % 3]))
+    db.session.commit()
+    return quiz_ids
+
+
+def _all_pages(filters, limit):
+    ids, cursor = [], None
+    while True:
+        rows, cursor = progress_report.progress_page(filters, cursor=cursor, limit=limit)
+        ids.extend(row.id for row in rows)
+        if cursor is None:
+            return ids
+
+
+def test_cursor_pages_have_no_gaps_or_duplicates_across_equal_timestamps(app):
+    _attempts()
+    expected = [row.id for row in progress_report.progress_page({}, limit=progress_report.MAX_PAGE_SIZE)[0]]
+    assert len(expected) == 24
+    for limit in (1, 4, 5, 23, 24):
+        assert _all_pages({}, limit) == expected
+
+
+def test_filters_apply_to_pages_and_exports(app):
+    quiz_ids = _attempts()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+
+    for args in ({'quiz_id': str(quiz_ids[2])}, {'subject_id': '1', 'date_from': '2026-05-02'},
+                 {'date_from': '2026-05-02', 'date_to': '2026-05-02'}):
+        filters = progress_report.parse_filters(args)
+        expected = [progress_report.row_dict(row)
+                    for row in progress_report.progress_page(filters, limit=progress_report.MAX_PAGE_SIZE)[0]]
+        assert 0 < len(expected) < 24
+
+        ndjson = client.get('/admin/user_progress_export', query_string=dict(args, format='ndjson')).get_data(as_text=True)
+        assert [json.loads(line) for line in ndjson.splitlines()] == expected
+        exported = client.get('/admin/user_progress_export', query_string=args).get_data(as_text=True)
+        rows = list(csv.DictReader(io.StringIO(exported)))
+        assert rows == [{key: str(value) for key, value in row.items()} for row in expected]
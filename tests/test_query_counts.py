@@ -0,0 +1,64 @@
+from contextlib import contextmanager
+from datetime import datetime
+import pytest
+from sqlalchemy import event
+from models import db
+from models.quiz import UserQuizProgress
+from services import analytics, catalog
+from conftest import add_catalog, add_user
+
+# Pages that list the whole catalog must not issue a query per subject, chapter or quiz
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+# Grow the catalog by subjects x quizzes, with an attempt by user_id at every new quiz
+def _grow(user_id, subjects, quizzes_per_subject):
+    known = {quiz_id for (quiz_id,) in db.session.query(UserQuizProgress.quiz_id)}
+    for quiz_id in add_catalog(subjects, quizzes_per_subject):
+        if quiz_id not in known:
+            db.session.add(UserQuizProgress(user_id=user_id, quiz_id=quiz_id, score=50, completed_on=datetime.now()))
+    analytics.rebuild()
+    catalog.bump_version()
+    db.session.commit()
+
+
+def _queries(client, path):
+    db.session.remove()
+    with count_queries() as statements:
+        assert client.get(path).status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize('path, admin', [
+    ('/user/', False),
+    ('/user/user_summary', False),
+    ('/admin/', True),
+])
+def test_catalog_pages_issue_a_constant_number_of_queries(app, path, admin):
+    user_id = add_user()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['admin_logged_in'] = admin
+
+    # Prime the caches that do not depend on the catalog, such as the user loader's identity cache
+    _queries(client, path)
+    counts = []
+    for subjects, quizzes_per_subject in ((1, 1), (3, 2), (10, 4)):
+        _grow(user_id, subjects, quizzes_per_subject)
+        # Cold: the catalog version changed, so the cached tree and fragments are rebuilt
+        cold = _queries(client, path)
+        counts.append((cold, _queries(client, path)))
+    assert counts[0] == counts[1] == counts[2], counts
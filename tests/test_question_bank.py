@@ -0,0 +1,62 @@
+import io
+import pytest
+from models import db
+from models.quiz import Question
+from services import question_bank
+from conftest import add_catalog
+
+
+def _admin_client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+    return client
+
+
+def test_web_upload_keeps_line_breaks_inside_quoted_fields(app):
+    quiz_id = add_catalog(1, questions_per_quiz=0)[0]
+    data = ('question_text,option_1,option_2,option_3,option_4,correct_option\r\n'
+            '"Line one\r\nLine two",A,"B, or\r\nC",C,D,2\r\n').encode()
+    response = _admin_client(app).post(f'/admin/import_questions/{quiz_id}',
+                                       data={'question_file': (io.BytesIO(data), 'bank.csv')})
+    assert response.status_code == 302
+    db.session.remove()
+    assert db.session.query(Question.question_text, Question.option_2).all() == [('Line one\r\nLine two', 'B, or\r\nC')]
+
+
+def _questions(quiz_id):
+    db.session.remove()
+    return [tuple(getattr(question, field) for field in question_bank.FIELDS)
+            for question in Question.query.filter_by(quiz_id=quiz_id).order_by(Question.id)]
+
+
+def test_csv_and_jsonl_exports_import_back_unchanged(app):
+    source, csv_copy, json_copy = add_catalog(3, questions_per_quiz=0)
+    rows = [
+        {'question_text': 'Plain?', 'option_1': 'A', 'option_2': 'B', 'option_3': 'C', 'option_4': 'D', 'correct_option': 3},
+        {'question_text': 'Quoted "text",\nover two lines?', 'option_1': 'x, y', 'option_2': '"z"',
+         'option_3': 'Ünïcode', 'option_4': 'line\r\nbreak', 'correct_option': '1'},
+    ]
+    assert question_bank.import_questions(source, iter(rows)) == 2
+    expected = _questions(source)
+
+    exported_csv = ''.join(question_bank.export_csv(source))
+    assert question_bank.import_questions(csv_copy, question_bank.iter_rows(io.StringIO(exported_csv, newline=''), 'bank.csv')) == 2
+    exported_json = ''.join(question_bank.export_json(source))
+    # A small chunk size makes objects span the read boundaries
+    assert question_bank.import_questions(json_copy, question_bank.iter_json(io.StringIO(exported_json), chunk_size=16)) == 2
+
+    assert _questions(csv_copy) == expected
+    assert _questions(json_copy) == expected
+    assert expected[1][0] == 'Quoted "text",\nover two lines?'
+
+
+def test_a_bad_row_rolls_back_the_whole_import(app):
+    quiz_id = add_catalog(1, questions_per_quiz=0)[0]
+    good = {'question_text': 'Fine?', 'option_1': 'A', 'option_2': 'B', 'option_3': 'C', 'option_4': 'D', 'correct_option': 1}
+    rows = [good] * 3 + [dict(good, correct_option=5), dict(good, option_2='')]
+    with pytest.raises(question_bank.QuestionImportError) as error:
+        # chunk_size=2 writes the first rows before the bad one is read
+        question_bank.import_questions(quiz_id, iter(rows), chunk_size=2)
+    assert error.value.errors == ['Row 4: correct_option must be a number from 1 to 4', 'Row 5: option_2 is required']
+    assert _questions(quiz_id) == []
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+import pytest
+from models import db
+from models.quiz_session import QuizSession
+from services import catalog, quiz_sessions
+from conftest import add_catalog, add_user
+
+
+def _start(quiz_id, user_id):
+    return quiz_sessions.start_session(user_id, catalog.get_quiz(quiz_id))
+
+
+def test_a_token_claimed_by_another_worker_cannot_be_submitted_again(app):
+    quiz_id = add_catalog(1)[0]
+    user_id = add_user()
+    entry = _start(quiz_id, user_id)
+    # Another worker accepted the submission; this worker's cached entry still looks open
+    db.session.query(QuizSession).filter_by(token=entry['token']).update({'submitted_on': datetime.now()})
+    db.session.commit()
+
+    with pytest.raises(quiz_sessions.QuizSessionError):
+        quiz_sessions.finish(entry['token'], user_id, quiz_id)
+
+
+def test_late_submission_is_graded_from_the_stored_answers(app):
+    quiz_id = add_catalog(1)[0]
+    user_id = add_user()
+    entry = _start(quiz_id, user_id)
+    # Answers autosaved through another worker, past the deadline
+    db.session.query(QuizSession).filter_by(token=entry['token']).update({
+        'answers': {'1': 2}, 'saved_on': datetime.now(), 'deadline': datetime.now() - timedelta(minutes=5),
+    })
+    db.session.commit()
+
+    finished, late = quiz_sessions.finish(entry['token'], user_id, quiz_id)
+    assert late
+    assert finished['answers'] == {'1': 2}
+    assert db.session.query(QuizSession.submitted_on).filter_by(token=entry['token']).scalar() is not None
+
+
+def test_start_quiz_does_not_grade_posted_answers(app):
+    quiz_id = add_catalog(1)[0]
+    user_id = add_user()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+    # Only submit_quiz accepts answers, with a session token and a deadline
+    assert client.post(f'/user/start_quiz/{quiz_id}', data={'question_1': '1'}).status_code == 405
+    assert client.get(f'/user/start_quiz/{quiz_id}').status_code == 200
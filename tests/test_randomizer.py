@@ -0,0 +1,52 @@
+import re
+from models import db
+from models.quiz import Quiz
+from models.question_set import QuestionSet
+from services import catalog, quiz_sessions, randomizer
+from conftest import add_catalog, add_user
+
+
+def _randomized_quiz(sample_size=None, questions=6):
+    quiz_id = add_catalog(1, questions_per_quiz=questions)[0]
+    db.session.query(Quiz).filter_by(id=quiz_id).update({'shuffle': True, 'sample_size': sample_size})
+    catalog.bump_version()
+    db.session.commit()
+    return catalog.get_quiz(quiz_id)
+
+
+def test_same_seed_gives_the_same_set_and_order(app):
+    quiz = _randomized_quiz(sample_size=3)
+    drawn = randomizer.draw(quiz, 1234)
+    assert drawn == sorted(drawn) and len(drawn) == 3
+    assert randomizer.draw(quiz, 1234) == drawn
+    assert randomizer.question_order(quiz, 1234, drawn) == randomizer.question_order(quiz, 1234, list(reversed(drawn)))
+    orders = {tuple(randomizer.question_order(quiz, seed, drawn)) for seed in range(50)}
+    assert len(orders) > 1
+
+
+def test_shuffled_attempts_share_one_question_set(app):
+    quiz = _randomized_quiz()
+    user_id = add_user()
+    set_ids = {quiz_sessions.start_session(user_id, quiz)['question_set_id']}
+    for username in ('second', 'third'):
+        set_ids.add(quiz_sessions.start_session(add_user(username), quiz)['question_set_id'])
+    assert len(set_ids) == 1
+    assert db.session.query(QuestionSet).count() == 1
+
+
+def test_view_quiz_shows_questions_in_the_order_they_were_served(app):
+    quiz = _randomized_quiz(sample_size=4)
+    user_id = add_user()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+
+    page = client.get(f'/user/start_quiz/{quiz["id"]}').get_data(as_text=True)
+    token = re.search(r'name="session_token" value="([^"]+)"', page).group(1)
+    served = re.findall(r'Question \d+\?', page)
+    assert len(served) == 4
+    response = client.post(f'/user/submit_quiz/{quiz["id"]}', data={'session_token': token})
+    assert response.status_code == 302
+
+    review = client.get(f'/user/view_quiz/{quiz["id"]}').get_data(as_text=True)
+    assert re.findall(r'Question \d+\?', review) == served
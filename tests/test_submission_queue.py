@@ -0,0 +1,78 @@
+import json
+from datetime import datetime
+from models import db
+from models.quiz import UserQuizProgress
+from models.analytics import DailyStats, UserStats
+from services.submission_queue import Submission, SubmissionQueue
+from conftest import add_catalog, add_user
+
+
+def test_rejected_attempt_is_dead_lettered_and_does_not_block_the_queue(app, tmp_path):
+    quiz_id = add_catalog(1)[0]
+    user_id = add_user()
+    journal_dir = tmp_path / 'submissions'
+    queue = SubmissionQueue(app, str(journal_dir), flush_interval=0.01, fsync=False)
+    try:
+        # A quiz that no longer exists violates the foreign key on every retry
+        bad = queue.submit(user_id, quiz_id + 100, 50, datetime.now(), None, b'\x01\x02')
+        good = queue.submit(user_id, quiz_id, 100, datetime.now(), None, b'\x01\x01')
+        assert good.wait(10) and good.error is None
+        # Waiters on the rejected attempt are released with the reason instead of timing out
+        assert bad.wait(10) and 'FOREIGN KEY' in bad.error
+        assert queue.depth() == 0
+    finally:
+        queue.close()
+
+    db.session.rollback()
+    rows = db.session.query(UserQuizProgress.quiz_id, UserQuizProgress.score).all()
+    assert rows == [(quiz_id, 100)]
+    dead = [json.loads(line) for line in (journal_dir / 'dead-letter.jsonl').read_text().splitlines()]
+    assert [(record['quiz_id'], record['score']) for record in dead] == [(quiz_id + 100, 50)]
+    assert 'FOREIGN KEY' in dead[0]['error']
+    assert not list(journal_dir.glob('submissions-*.jsonl'))
+
+
+def test_retakes_in_one_batch_keep_the_latest_score_and_count_every_submission(app, tmp_path):
+    quiz_id = add_catalog(1)[0]
+    user_id = add_user()
+    queue = SubmissionQueue(app, str(tmp_path / 'submissions'), flush_interval=0.01, fsync=False)
+    try:
+        first = datetime(2026, 3, 1, 9, 0)
+        # Both attempts go through one flush
+        queue._flush([
+            {'user_id': user_id, 'quiz_id': quiz_id, 'score': 40, 'completed_on': first.isoformat(),
+             'question_set_id': None, 'answers': '0102'},
+            {'user_id': user_id, 'quiz_id': quiz_id, 'score': 80, 'completed_on': first.replace(hour=10).isoformat(),
+             'question_set_id': None, 'answers': '0101'},
+        ])
+    finally:
+        queue.close()
+
+    db.session.rollback()
+    assert db.session.query(UserQuizProgress.score).all() == [(80,)]
+    assert db.session.query(UserStats.attempts, UserStats.score_sum).all() == [(1, 80)]
+    assert db.session.query(DailyStats.attempts, DailyStats.score_sum).all() == [(2, 120)]
+
+
+def test_journal_is_only_rewritten_once_committed_attempts_fill_most_of_it(tmp_path):
+    # The compaction bookkeeping on its own, without the worker thread
+    queue = SubmissionQueue.__new__(SubmissionQueue)
+    queue.fsync = False
+    queue._committed_bytes = 0
+    queue._journal = open(tmp_path / 'journal.jsonl', 'a+', encoding='utf-8')
+    records = [{'user_id': 1, 'quiz_id': quiz_id, 'score': 50} for quiz_id in range(4)]
+    queue._write_journal(records)
+    queue._pending = [(record, Submission()) for record in records]
+
+    def commit(count):
+        batch = queue._pending[:count]
+        del queue._pending[:count]
+        queue._compact_journal(batch)
+        return [json.loads(line)['quiz_id'] for line in (tmp_path / 'journal.jsonl').read_text().splitlines()]
+
+    try:
+        assert commit(1) == [0, 1, 2, 3]  # Appended to only
+        assert commit(2) == [3]  # Mostly committed: rewritten with the pending attempt
+        assert commit(1) == []  # Drained
+    finally:
+        queue._journal.close()
@@ -0,0 +1,57 @@
+from sqlalchemy import event
+from models import db
+from models.user import User
+from services import user_search
+from conftest import add_user
+
+
+def _add_users():
+    names = ['Johnny Appleseed', 'Joanna Smith', 'Bo Li', 'Ada Johnson', 'Jo Lee', 'Anna Smithers']
+    ids = {}
+    for i, name in enumerate(names):
+        ids[name] = add_user(f'user{i}')
+        db.session.get(User, ids[name]).full_name = name
+    db.session.commit()
+    return ids
+
+
+def _search(query, **kwargs):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        users, next_after = user_search.search_users(query, **kwargs)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    used_fts = any('MATCH' in statement for statement in statements)
+    return [user.full_name for user in users], next_after, used_fts
+
+
+def test_terms_of_three_characters_or_more_use_the_trigram_index(app):
+    _add_users()
+    assert _search('ohn') == (['Johnny Appleseed', 'Ada Johnson'], None, True)
+    # Every term must match, in any column and order
+    assert _search('smith ann') == (['Joanna Smith', 'Anna Smithers'], None, True)
+    # FTS5 syntax in user input is matched literally
+    assert _search('smith NEAR(') == ([], None, True)
+
+
+def test_short_terms_fall_back_to_like(app):
+    _add_users()
+    assert _search('Jo') == (['Johnny Appleseed', 'Joanna Smith', 'Ada Johnson', 'Jo Lee'], None, False)
+    assert _search('li')[:2] == (['Bo Li'], None)
+
+
+def test_keyset_pages_cover_every_match_once(app):
+    _add_users()
+    for query in ('', 'Jo', 'smith'):
+        expected = _search(query, limit=100)[0]
+        pages, after = [], None
+        while True:
+            names, after, _ = _search(query, after_id=after, limit=2)
+            pages.extend(names)
+            if after is None:
+                break
+        assert pages == expected